@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Non-blocking access log for the http.server based API
+
+Request threads never touch the output stream: they append a small tuple to
+a bounded in-memory ring and return. A background writer thread drains the
+ring in batches, formats the records and writes each batch with a single
+write() and flush(). When the ring is full (the sink is slower than the
+traffic) new records are dropped and counted instead of blocking requests.
+
+deque.append() and deque.popleft() are atomic, so the ring needs no lock;
+the only lock guards starting the writer thread once.
+"""
+
+import atexit
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+FORMATS = ('text', 'json')
+
+
+class AccessLog:
+    """
+    Buffered access log drained by a background writer thread
+
+    Args:
+        stream (file): where lines go (default: sys.stdout at write time)
+        fmt (str): 'text' for the classic '[client]"request" status size'
+            lines, 'json' for one JSON object per line
+        sample (float): fraction of successful requests to keep, 0.0-1.0;
+            errors (status >= 400) and messages are always kept
+        capacity (int): records held before new ones are dropped
+        batch (int): most records written per write() call
+        interval (float): seconds the writer sleeps when the ring is empty
+    """
+
+    def __init__(self, stream=None, fmt='text', sample=1.0, capacity=8192,
+                 batch=512, interval=0.2):
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}")
+        if not 0.0 <= sample <= 1.0:
+            raise ValueError("sample must be between 0.0 and 1.0")
+        self.stream = stream
+        self.fmt = fmt
+        self.sample = sample
+        self.capacity = capacity
+        self.batch = batch
+        self.interval = interval
+
+        self.ring = deque()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+        # Only the writer thread updates written; dropped and sampled_out
+        # may lose an increment under contention, which is fine for stats
+        self.written = 0
+        self.dropped = 0
+        self.sampled_out = 0
+
+    def log_request(self, client, requestline, status, size='-'):
+        """Queue one access record; never blocks"""
+
+        if self.sample < 1.0 and status < 400 and \
+                random.random() >= self.sample:
+            self.sampled_out += 1
+            return
+        self._push((time.time(), client, requestline, status, size))
+
+    def log_message(self, client, message):
+        """Queue a free-form line, e.g. an error from send_error()"""
+
+        self._push((time.time(), client, None, None, message))
+
+    def _push(self, record):
+        if len(self.ring) >= self.capacity:
+            self.dropped += 1
+            return
+        self.ring.append(record)
+        if self.thread is None:
+            self.start()
+        elif len(self.ring) >= self.batch:
+            self.wakeup.set()
+
+    def start(self):
+        """Start the writer thread (done on the first record anyway)"""
+
+        with self.start_lock:
+            if self.thread is not None:
+                return
+            self.stopping = False
+            self.thread = threading.Thread(target=self._run,
+                                           name='access-log', daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def close(self):
+        """Stop the writer after it has written everything queued"""
+
+        thread = self.thread
+        if thread is None:
+            return
+        self.stopping = True
+        self.wakeup.set()
+        thread.join()
+        self.thread = None
+
+    def stats(self):
+        """Counters for monitoring the log itself"""
+
+        return {
+            'queued': len(self.ring),
+            'written': self.written,
+            'dropped': self.dropped,
+            'sampled_out': self.sampled_out,
+        }
+
+    def _run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            while self.ring:
+                self._write_batch()
+            if self.stopping:
+                # Records pushed during the last drain
+                while self.ring:
+                    self._write_batch()
+                return
+
+    def _write_batch(self):
+        ring = self.ring
+        lines = []
+        for _ in range(min(len(ring), self.batch)):
+            lines.append(self._format(ring.popleft()))
+        stream = self.stream or sys.stdout
+        try:
+            stream.write(''.join(lines))
+            stream.flush()
+        except (OSError, ValueError):
+            # Closed or broken sink: count the batch as lost, keep serving
+            self.dropped += len(lines)
+            return
+        self.written += len(lines)
+
+    def _format(self, record):
+        when, client, requestline, status, extra = record
+        if self.fmt == 'text':
+            if requestline is None:
+                return f"[{client}]{extra}\n"
+            return f"[{client}]\"{requestline}\" {status} {extra}\n"
+
+        stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(when))
+        entry = {
+            'time': f"{stamp}.{int(when % 1 * 1000):03d}Z",
+            'client': client,
+        }
+        if requestline is None:
+            entry['message'] = extra
+        else:
+            parts = requestline.split()
+            if len(parts) == 3:
+                entry['method'], entry['path'], entry['version'] = parts
+            else:
+                entry['request'] = requestline
+            entry['status'] = status
+            entry['size'] = None if extra == '-' else extra
+        return json.dumps(entry) + '\n'
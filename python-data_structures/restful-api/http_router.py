@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Table-driven request router for http.server handlers.
+
+Static paths live in a dict keyed by path, so matching them is one lookup
+regardless of how many routes exist. Paths with parameters are stored in a
+segment trie, so matching costs O(path depth) rather than O(routes).
+
+Patterns:
+  /status              static path
+  /users/<name>        one segment, captured as params["name"]
+  /files/<path:rest>   the remaining path (may contain "/"), params["rest"]
+
+Query strings and fragments are ignored when matching, and captured
+parameters are percent-decoded.
+"""
+
+from collections import namedtuple
+from urllib.parse import unquote, urlsplit
+
+# handler is None when nothing matched; allowed then lists the methods the
+# path does support (empty -> 404, non-empty -> 405). pattern is the route
+# as registered, handy as a low-cardinality label for logs and metrics.
+Match = namedtuple("Match", ["handler", "params", "allowed", "pattern"])
+
+NO_MATCH = Match(None, {}, (), None)
+
+
+class _Node:
+    """One path segment of the parameter trie."""
+
+    __slots__ = ("children", "param", "param_name", "rest_name",
+                 "rest_methods", "rest_pattern", "methods", "pattern")
+
+    def __init__(self):
+        self.children = {}      # literal segment -> _Node
+        self.param = None       # _Node for a <name> segment
+        self.param_name = None
+        self.rest_name = None   # name of a trailing <path:name>
+        self.rest_methods = None
+        self.rest_pattern = None
+        self.methods = None     # {method: handler} when a route ends here
+        self.pattern = None
+
+
+class Router:
+    """Maps (method, path) to a handler."""
+
+    def __init__(self):
+        self.static = {}
+        self.root = _Node()
+
+    def add(self, method, pattern, handler):
+        """Register ``handler`` for ``method`` requests on ``pattern``."""
+        method = method.upper()
+        if "<" not in pattern:
+            self.static.setdefault(pattern, ({}, pattern))[0][method] = handler
+            return handler
+
+        node = self.root
+        segments = pattern.strip("/").split("/")
+        for index, segment in enumerate(segments):
+            if segment.startswith("<path:") and segment.endswith(">"):
+                if index != len(segments) - 1:
+                    raise ValueError(f"{pattern!r}: <path:> must come last")
+                name = segment[6:-1]
+                if node.rest_name not in (None, name):
+                    raise ValueError(f"{pattern!r}: conflicting parameter")
+                node.rest_name = name
+                if node.rest_methods is None:
+                    node.rest_methods = {}
+                    node.rest_pattern = pattern
+                node.rest_methods[method] = handler
+                return handler
+            if segment.startswith("<") and segment.endswith(">"):
+                name = segment[1:-1]
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise ValueError(f"{pattern!r}: conflicting parameter")
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+        if node.methods is None:
+            node.methods = {}
+            node.pattern = pattern
+        node.methods[method] = handler
+        return handler
+
+    def route(self, method, pattern):
+        """Decorator form of add()."""
+        def decorator(handler):
+            return self.add(method, pattern, handler)
+        return decorator
+
+    def match(self, method, target):
+        """Resolve a request target (path plus optional query) to a Match."""
+        path = urlsplit(target).path
+        found = self.static.get(path)
+        params = {}
+        if found is None:
+            found = self._walk(self.root, path.strip("/").split("/"), 0,
+                               params)
+            if found is None:
+                return NO_MATCH
+        methods, pattern = found
+        handler = methods.get(method.upper())
+        if handler is None:
+            return Match(None, {}, tuple(methods), pattern)
+        return Match(handler, params, methods.keys(), pattern)
+
+    def _walk(self, node, segments, index, params):
+        """Depth-first trie walk; literal segments win over parameters."""
+        if index == len(segments):
+            if node.methods is None:
+                return None
+            return node.methods, node.pattern
+        segment = segments[index]
+        child = node.children.get(segment)
+        if child is not None:
+            found = self._walk(child, segments, index + 1, params)
+            if found is not None:
+                return found
+        if node.param is not None and segment:
+            found = self._walk(node.param, segments, index + 1, params)
+            if found is not None:
+                params[node.param_name] = unquote(segment)
+                return found
+        if node.rest_name is not None:
+            rest = "/".join(segments[index:])
+            if rest:
+                params[node.rest_name] = unquote(rest)
+                return node.rest_methods, node.rest_pattern
+        return None
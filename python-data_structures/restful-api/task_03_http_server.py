@@ -2,10 +2,53 @@
 """
 Simple API server using python's http.server module
 Shows Basic HTTP request handling and JSON responses
+
+Large collections are streamed with HTTP/1.1 chunked transfer encoding
+(see send_chunked and iter_json_array), so the first byte goes out before
+the whole payload exists and memory use does not grow with its size.
 """
 
 import json
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from access_log import AccessLog
+from http_router import Router
+
+# Routes are registered on the handler methods below; matching ignores the
+# query string, so '/data?x=1' still reaches _handle_data
+ROUTER = Router()
+
+# Streamed pieces are gathered until at least this many bytes are pending,
+# so a generator yielding tiny items does not cost one write() per item
+CHUNK_SIZE = 16384
+
+# Upper bound for /stream?count=N
+MAX_STREAM_COUNT = 10000000
+
+# Seconds an idle keep-alive connection may hold its thread
+KEEPALIVE_TIMEOUT = 5
+
+
+def iter_json_array(items):
+    """
+    Encode an iterable as a JSON array, one piece at a time
+
+    Only the current item is held in memory, so a generator of any length
+    can be sent without building the whole document first.
+
+    Args:
+        items (iterable): JSON-serialisable objects
+
+    Yields:
+        bytes: '[', each encoded item with its separator, then ']'
+    """
+    encode = json.JSONEncoder().encode
+    separator = b'['
+    for item in items:
+        yield separator + encode(item).encode()
+        separator = b', '
+    yield b'[]' if separator == b'[' else b']'
 
 
 class SimpleAPIHandler(BaseHTTPRequestHandler):
@@ -14,32 +57,115 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
     Class will handle different simple API endpoints
     """
 
+    # HTTP/1.1 so responses can be chunked; every response therefore
+    # carries either a Content-Length or Transfer-Encoding: chunked
+    protocol_version = 'HTTP/1.1'
+
+    # Idle keep-alive clients are disconnected instead of pinning a thread
+    timeout = KEEPALIVE_TIMEOUT
+
+    # TCP_NODELAY: headers and body are separate writes, and Nagle would
+    # hold the body back until the client's delayed ACK on a reused
+    # connection
+    disable_nagle_algorithm = True
+
+    # Lines are queued here and written by a background thread, so a slow
+    # terminal or pipe never holds up a request (see access_log.py)
+    access_log = AccessLog()
+
     def do_GET(self):
         """
         Method will be called whenever we GET a request to our server
         """
 
-        if self.path == '/':
-            self._handle_root()
-        elif self.path == '/data':
-            self._handle_data()
-        elif self.path == '/status':
-            self._handle_status()
-        else:
+        match = ROUTER.match('GET', self.path)
+        if match.handler is None:
             self._handle_not_found()
+        else:
+            match.handler(self, **match.params)
+
+    def send_body(self, status, content_type, body):
+        """
+        Send a complete response whose body is already in memory
 
+        Args:
+            status (int): HTTP status code
+            content_type (str): value of the Content-Type header
+            body (bytes): the response body
+        """
+
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        self.wfile.write(body)
+
+    def send_chunked(self, status, content_type, chunks):
+        """
+        Send a response whose body is produced by an iterable of bytes
+
+        The body goes out with Transfer-Encoding: chunked as it is produced.
+        HTTP/1.0 clients do not understand chunks, so they get the raw
+        bytes and the end of the body is marked by closing the connection.
+        If the generator raises after the headers are sent the status can
+        no longer change; the connection is dropped without the final
+        chunk, so the client sees a truncated response rather than a
+        complete-looking one.
+
+        Args:
+            status (int): HTTP status code
+            content_type (str): value of the Content-Type header
+            chunks (iterable): bytes pieces of the body, any size
+        """
+
+        chunked = self.request_version != 'HTTP/1.0'
+        self.send_response(status)
+        self.send_header('Content-type', content_type)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+        def flush(pending):
+            data = b''.join(pending)
+            if chunked:
+                data = b'%x\r\n%s\r\n' % (len(data), data)
+            self.wfile.write(data)
+
+        pending = []
+        size = 0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    # An empty chunk would end the body early
+                    continue
+                pending.append(chunk)
+                size += len(chunk)
+                if size >= CHUNK_SIZE:
+                    flush(pending)
+                    pending = []
+                    size = 0
+        except Exception:
+            self.close_connection = True
+            raise
+        if pending:
+            flush(pending)
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    @ROUTER.route('GET', '/')
     def _handle_root(self):
         """
         Handles requests to the root endpoint '/'
         Welcome users to the API.
         """
 
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
-
-        self.wfile.write(b"Hello, this is a simple API!")
+        self.send_body(200, 'text/plain', b"Hello, this is a simple API!")
 
+    @ROUTER.route('GET', '/data')
     def _handle_data(self):
         """
         Handles request to /data endpoint
@@ -54,53 +180,85 @@ class SimpleAPIHandler(BaseHTTPRequestHandler):
 
         json_data = json.dumps(data)
 
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json_data.encode())
+        self.send_body(200, 'application/json', json_data.encode())
 
+    @ROUTER.route('GET', '/status')
     def _handle_status(self):
         """
         Handles requests to /status endpoint
         Returns simple status information
         """
 
-        self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
+        self.send_body(200, 'text/plain', b"OK")
+
+    @ROUTER.route('GET', '/stream')
+    def _handle_stream(self):
+        """
+        Handles requests to /stream?count=N endpoint
+        Streams a JSON array of N generated people (default 1000)
 
-        self.wfile.write(b"OK")
+        Records are generated while the response is being written, so
+        time-to-first-byte and memory stay flat however large N is.
+        """
+
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            count = int(query.get('count', ['1000'])[0])
+        except ValueError:
+            count = -1
+        if not 0 <= count <= MAX_STREAM_COUNT:
+            self.send_body(400, 'text/plain',
+                           b"count must be an integer from 0 to %d"
+                           % MAX_STREAM_COUNT)
+            return
+
+        people = (
+            {"id": i, "name": f"user{i}", "age": 20 + i % 50,
+             "city": "New York"}
+            for i in range(count)
+        )
+        self.send_chunked(200, 'application/json', iter_json_array(people))
 
     def _handle_not_found(self):
         """
         Handles undefined request endpoints
         Returns 404 NOT FOUND error
         """
-        self.send_response(404)
-        self.send_header('Content-type', 'text/plain')
-        self.end_headers()
+        self.send_body(404, 'text/plain', b"Endpoint not found")
 
-        self.wfile.write(b"Endpoint not found")
+    def log_request(self, code='-', size='-'):
+        """
+        Queue an access record for each response sent
+        Replaces the synchronous print() of the default handler
+        """
+        self.access_log.log_request(self.address_string(), self.requestline,
+                                    int(code), size)
 
     def log_message(self, format, *args):
         """
         Override default logging making it more informative
-        Shows requests are being made
+        Used for errors and other messages that are not access records
         """
-        print(f"[{self.address_string()}]{format % args}")
+        self.access_log.log_message(self.address_string(), format % args)
 
 
-def run_server(port=8000):
+def run_server(port=8000, log_format='text', log_sample=1.0):
     """
     Create and run the HTTP Server
     Sets up and begins listening for connections inbound
 
     Args:
         port (int): port to run server on (default:8000)
+        log_format (str): access log lines as 'text' or 'json'
+        log_sample (float): fraction of successful requests logged
     """
     server_address = ('', port)
+    SimpleAPIHandler.access_log = AccessLog(fmt=log_format,
+                                            sample=log_sample)
 
-    httpd = HTTPServer(server_address, SimpleAPIHandler)
+    # One thread per connection: with HTTP/1.1 keep-alive a single-threaded
+    # server would be held by whichever client connected first
+    httpd = ThreadingHTTPServer(server_address, SimpleAPIHandler)
     print(f"Server running on port {port}...")
 
     httpd.serve_forever()
@@ -0,0 +1,736 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the restful-api servers.
+
+Every server is started locally in a subprocess (or in-process where noted)
+and driven by an asyncio load generator over HTTP/1.1 keep-alive:
+
+  closed loop  --concurrency N clients, each sending its next request as
+               soon as the previous answer arrives
+  open loop    --rate R requests/second on a fixed schedule, at most
+               --concurrency in flight; latency is measured from the
+               scheduled send time, so queueing delay is not hidden
+
+Subcommands:
+  load         per-endpoint p50/p99/p999 latency and req/s for task_03
+               (http), task_04 (flask) or task_05 (security); --save writes
+               the run as JSON and --compare diffs it against a saved run
+  modes        req/s of each task_03 serving mode (threaded/async/prefork)
+  compression  bytes on the wire and latency with and without gzip
+  metrics      cost of recording one request in http_metrics
+  ingest       users/second through the POST /add_users NDJSON parser
+  query        GET /users filters through the city/age indexes vs a scan
+  stress       UserStore ops/s by thread count, one lock vs lock striping
+  startup      task_05 import time and first lookup by user table size
+
+Usage:
+  python3 benchmark.py load --server http [--rate 2000] [--save run.json]
+                            [--compare previous.json]
+  python3 benchmark.py modes [--concurrency 200] [--path /data] [--no-reuse]
+  python3 benchmark.py compression [--records 2000]
+  python3 benchmark.py metrics
+  python3 benchmark.py ingest [--users 200000]
+  python3 benchmark.py query [--users 1000000]
+  python3 benchmark.py stress [--threads 1,2,4,8,16] [--log]
+  python3 benchmark.py startup [--users 0,1000,100000]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import task_03_http_server as api
+import user_store
+from http_metrics import Metrics
+from user_log import LogBackend
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HOST = "127.0.0.1"
+
+
+# --- server processes --------------------------------------------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, proc=None, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            with socket.create_connection((HOST, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def flask_argv(module, port):
+    code = (f"import {module} as m; "
+            f"m.app.run(host={HOST!r}, port={port}, threaded=True)")
+    return [sys.executable, "-c", code]
+
+
+def start_process(argv, port):
+    proc = subprocess.Popen(argv, cwd=HERE, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, proc)
+    except Exception:
+        proc.kill()
+        raise
+    return proc
+
+
+def start_server(mode, port):
+    return start_process(
+        [sys.executable, os.path.join(HERE, "task_03_http_server.py"),
+         "--mode", mode, "--port", str(port)],
+        port,
+    )
+
+
+def call(port, method, path, body=None, headers=None):
+    """Plain blocking request used to seed data before a run."""
+    data = None if body is None else json.dumps(body).encode()
+    request = urllib.request.Request(
+        f"http://{HOST}:{port}{path}", data=data, method=method,
+        headers={"Content-Type": "application/json", **(headers or {})},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read() or b"null")
+
+
+# --- scenarios ---------------------------------------------------------------
+# Each scenario returns (server argv, seed callable or None, endpoints). The
+# endpoints are (label, method, path, headers, json body) tuples, or a
+# callable producing them once seeding has run (e.g. to embed tokens).
+def http_scenario(port, args):
+    argv = [sys.executable, os.path.join(HERE, "task_03_http_server.py"),
+            "--mode", args.mode, "--port", str(port)]
+    endpoints = [("GET " + path, "GET", path, {}, None)
+                 for path in ("/", "/status", "/data", "/info")]
+    return argv, None, endpoints
+
+
+def flask_scenario(port, args):
+    def seed():
+        call(port, "POST", "/add_user", {
+            "username": "john", "name": "John", "age": 30,
+            "city": "New York",
+        })
+
+    user = {"username": "bench", "name": "Bench", "age": 1, "city": "X"}
+    endpoints = [
+        ("GET /", "GET", "/", {}, None),
+        ("GET /status", "GET", "/status", {}, None),
+        ("GET /data", "GET", "/data", {}, None),
+        ("GET /users/john", "GET", "/users/john", {}, None),
+        ("POST /add_user", "POST", "/add_user", {}, user),
+    ]
+    return flask_argv("task_04_flask", port), seed, endpoints
+
+
+def security_scenario(port, args):
+    tokens = {}
+
+    def seed():
+        for name in ("user1", "admin1"):
+            tokens[name] = call(port, "POST", "/login", {
+                "username": name, "password": "password",
+            })["access_token"]
+
+    basic = "Basic " + base64.b64encode(b"user1:password").decode()
+    credentials = {"username": "user1", "password": "password"}
+
+    def endpoints():
+        bearer = {"Authorization": f"Bearer {tokens['user1']}"}
+        admin = {"Authorization": f"Bearer {tokens['admin1']}"}
+        return [
+            ("GET /basic-protected", "GET", "/basic-protected",
+             {"Authorization": basic}, None),
+            ("POST /login", "POST", "/login", {}, credentials),
+            ("GET /jwt-protected", "GET", "/jwt-protected", bearer, None),
+            ("GET /admin-only", "GET", "/admin-only", admin, None),
+        ]
+
+    return flask_argv("task_05_basic_security", port), seed, endpoints
+
+
+SCENARIOS = {
+    "http": http_scenario,
+    "flask": flask_scenario,
+    "security": security_scenario,
+}
+
+
+# --- load generation ---------------------------------------------------------
+def build_request(method, path, headers=None, body=None):
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {HOST}"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    payload = b""
+    if body is not None:
+        payload = json.dumps(body).encode()
+        lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(payload)}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + payload
+
+
+async def read_response(reader):
+    """Read one response.
+
+    Returns (2xx?, bytes, server closes the connection?). Handles
+    Content-Length, chunked and read-until-close framing.
+    """
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = None
+    chunked = False
+    closing = head.startswith(b"HTTP/1.0")
+    for line in head.lower().split(b"\r\n")[1:]:
+        if line.startswith(b"content-length:"):
+            length = int(line[15:])
+        elif line.startswith(b"transfer-encoding:") and b"chunked" in line:
+            chunked = True
+        elif line.startswith(b"connection:"):
+            closing = b"close" in line or (
+                closing and b"keep-alive" not in line
+            )
+    size = len(head)
+    if chunked:
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            chunk = int(line.split(b";")[0], 16)
+            await reader.readexactly(chunk + 2)
+            size += len(line) + chunk + 2
+            if chunk == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+        size += length
+    else:
+        size += len(await reader.read())
+        closing = True
+    return head[9:10] == b"2", size, closing
+
+
+class Result:
+    """Latencies and counters for one endpoint."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def add(self, ok, size, seconds):
+        if ok:
+            self.latencies.append(seconds)
+        else:
+            self.errors += 1
+        self.bytes += size
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        count = len(ordered)
+
+        def pick(q):
+            if not count:
+                return 0.0
+            return ordered[min(count - 1, int(q * count))] * 1000
+
+        done = max(count + self.errors, 1)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "rps": count / self.elapsed if self.elapsed else 0.0,
+            "bytes_per_response": self.bytes / done,
+            "mean_ms": sum(ordered) / count * 1000 if count else 0.0,
+            "p50_ms": pick(0.50),
+            "p99_ms": pick(0.99),
+            "p999_ms": pick(0.999),
+            "max_ms": ordered[-1] * 1000 if count else 0.0,
+        }
+
+
+class Connection:
+    """One keep-alive connection that reopens after the server closes it."""
+
+    def __init__(self, port):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def send(self, request):
+        try:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(
+                    HOST, self.port
+                )
+            self.writer.write(request)
+            ok, size, closing = await read_response(self.reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.close()
+            return False, 0
+        if closing:
+            self.close()
+        return ok, size
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def closed_loop(port, request, concurrency, duration, result):
+    async def worker():
+        connection = Connection(port)
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            ok, size = await connection.send(request)
+            result.add(ok, size, time.monotonic() - started)
+        connection.close()
+
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.monotonic() - start
+
+
+async def open_loop(port, request, rate, concurrency, duration, result):
+    pool = asyncio.Queue()
+    for _ in range(concurrency):
+        pool.put_nowait(Connection(port))
+
+    async def one(scheduled):
+        connection = await pool.get()
+        try:
+            ok, size = await connection.send(request)
+        finally:
+            pool.put_nowait(connection)
+        result.add(ok, size, time.monotonic() - scheduled)
+
+    start = time.monotonic()
+    interval = 1.0 / rate
+    tasks = []
+    for index in range(int(rate * duration)):
+        scheduled = start + index * interval
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(scheduled)))
+    await asyncio.gather(*tasks)
+    result.elapsed = time.monotonic() - start
+    while not pool.empty():
+        pool.get_nowait().close()
+
+
+def measure(port, request, args):
+    result = Result()
+    if getattr(args, "rate", None):
+        run = open_loop(port, request, args.rate, args.concurrency,
+                        args.duration, result)
+    else:
+        run = closed_loop(port, request, args.concurrency, args.duration,
+                          result)
+    asyncio.run(run)
+    return result
+
+
+# --- subcommands -------------------------------------------------------------
+def print_table(endpoints):
+    print(f"{'endpoint':<24}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'p999 ms':>9}{'errors':>8}")
+    for label, stats in endpoints.items():
+        print(f"{label:<24}{stats['rps']:>10.0f}{stats['p50_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}{stats['p999_ms']:>9.2f}"
+              f"{stats['errors']:>8}")
+
+
+def compare(current, previous, tolerance):
+    """Print deltas against a saved run; returns True on a regression."""
+    print(f"\nvs {previous['timestamp']} ({previous['server']}):")
+    regressed = False
+    for label, stats in current["endpoints"].items():
+        before = previous["endpoints"].get(label)
+        if not before:
+            continue
+        rps = p99 = 0.0
+        if before["rps"]:
+            rps = (stats["rps"] / before["rps"] - 1) * 100
+        if before["p99_ms"]:
+            p99 = (stats["p99_ms"] / before["p99_ms"] - 1) * 100
+        flag = ""
+        if rps < -tolerance or p99 > tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{label:<24}req/s {rps:+7.1f}%   p99 {p99:+7.1f}%{flag}")
+    return regressed
+
+
+def cmd_load(args):
+    port = free_port()
+    argv, seed, endpoints = SCENARIOS[args.server](port, args)
+    proc = start_process(argv, port)
+    try:
+        if seed is not None:
+            seed()
+        if callable(endpoints):
+            endpoints = endpoints()
+        loop = (f"open loop {args.rate:g}/s" if args.rate
+                else f"closed loop x{args.concurrency}")
+        print(f"{args.server}: {loop}, {args.duration:g}s per endpoint")
+        results = {}
+        for label, method, path, headers, body in endpoints:
+            if args.endpoint and label not in args.endpoint:
+                continue
+            request = build_request(method, path, headers, body)
+            results[label] = measure(port, request, args).summary()
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print_table(results)
+    run = {
+        "server": args.server,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {
+            "mode": args.mode, "concurrency": args.concurrency,
+            "rate": args.rate, "duration": args.duration,
+        },
+        "endpoints": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        if compare(run, previous, args.tolerance):
+            return 1
+    return 0
+
+
+def cmd_modes(args):
+    reuse = "new connection per request" if args.no_reuse else "keep-alive"
+    print(f"GET {args.path}, {args.concurrency} clients, "
+          f"{args.duration:g}s, {reuse}")
+    print(f"{'mode':<10}{'req/s':>12}{'p99 ms':>10}{'errors':>10}")
+    headers = {"Connection": "close"} if args.no_reuse else {}
+    request = build_request("GET", args.path, headers)
+    for mode in api.MODES:
+        port = free_port()
+        proc = start_server(mode, port)
+        try:
+            stats = measure(port, request, args).summary()
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{mode:<10}{stats['rps']:>12.0f}{stats['p99_ms']:>10.2f}"
+              f"{stats['errors']:>10}")
+
+
+def cmd_compression(args):
+    records = [
+        {"id": i, "name": f"user{i}", "age": 20 + i % 50, "city": "New York"}
+        for i in range(args.records)
+    ]
+    api.static_route("/bench/records", api.json_body(200, records))
+    port = free_port()
+    server = api.ThreadedHTTPServer((HOST, port), api.SimpleAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"GET /bench/records ({args.records} records), "
+          f"{args.concurrency} clients, {args.duration:g}s, keep-alive")
+    print(f"{'encoding':<10}{'req/s':>10}{'bytes/resp':>12}"
+          f"{'mean ms':>10}{'p99 ms':>10}{'errors':>8}")
+    try:
+        for label, headers in (("identity", {}),
+                               ("gzip", {"Accept-Encoding": "gzip"})):
+            request = build_request("GET", "/bench/records", headers)
+            stats = measure(port, request, args).summary()
+            print(f"{label:<10}{stats['rps']:>10.0f}"
+                  f"{stats['bytes_per_response']:>12.0f}"
+                  f"{stats['mean_ms']:>10.2f}{stats['p99_ms']:>10.2f}"
+                  f"{stats['errors']:>8}")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def cmd_metrics(args, calls=1_000_000):
+    metrics = Metrics()
+    routes = ("/", "/status", "/data", "/info")
+    samples = [
+        (routes[i % 4], 200 if i % 10 else 404, 180 + i % 50, (i % 997) / 1e5)
+        for i in range(1000)
+    ]
+    for route, status, size, seconds in samples:
+        metrics.record(route, status, size, seconds)     # warm shards
+
+    start = time.perf_counter()
+    for _ in range(calls // len(samples)):
+        for route, status, size, seconds in samples:
+            metrics.record(route, status, size, seconds)
+    elapsed = time.perf_counter() - start
+    print(f"METRICS.record(): {elapsed / calls * 1e6:.2f} us per request "
+          f"({calls} calls)")
+
+
+def cmd_ingest(args):
+    # In-process: measures parsing, validation and insertion on one core
+    # without HTTP, which is what bounds POST /add_users
+    body = "".join(
+        json.dumps({"username": f"user{i:08d}", "name": f"User {i}",
+                    "age": 20 + i % 50, "city": "New York"}) + "\n"
+        for i in range(args.users)
+    ).encode()
+    for label, order in (("sorted", 1), ("shuffled", -1)):
+        if order < 0:
+            lines = body.splitlines(keepends=True)
+            lines.sort(key=hash)
+            body = b"".join(lines)
+        store = user_store.UserStore()
+        start = time.perf_counter()
+        summary = user_store.ingest_ndjson(io.BytesIO(body), store)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<9} {summary['added']} users in {elapsed:.2f}s: "
+              f"{summary['added'] / elapsed:,.0f} users/s "
+              f"({len(body) / elapsed / 1e6:.1f} MB/s)")
+
+
+def cmd_query(args):
+    rng = random.Random(42)
+    # A few big cities and a long tail of small ones, ages 18-90
+    cities = [f"City{i}" for i in range(200)]
+    weights = [1 / (i + 1) for i in range(len(cities))]
+    picks = rng.choices(cities, weights, k=args.users)
+    store = user_store.UserStore()
+    start = time.perf_counter()
+    store.load([{
+        f"user{i:08d}": {"username": f"user{i:08d}", "name": f"User {i}",
+                         "age": rng.randint(18, 90), "city": picks[i]}
+        for i in range(args.users)
+    }])
+    print(f"{args.users} users loaded and indexed in "
+          f"{time.perf_counter() - start:.1f}s")
+
+    queries = [
+        ("big city", {"city": "City0"}),
+        ("small city", {"city": "City199"}),
+        ("age 30-40", {"min_age": 30, "max_age": 40}),
+        ("big city, age 30-40",
+         {"city": "City0", "min_age": 30, "max_age": 40}),
+        ("small city, age 30-40",
+         {"city": "City199", "min_age": 30, "max_age": 40}),
+        ("big city, age 42", {"city": "City0", "min_age": 42, "max_age": 42}),
+    ]
+    print(f"{'query (limit 100)':<24}{'indexed us':>12}{'scan ms':>10}"
+          f"{'matches':>10}")
+    for label, filters in queries:
+        rounds = 200
+        start = time.perf_counter()
+        for _ in range(rounds):
+            store.query(limit=100, **filters)
+        indexed = (time.perf_counter() - start) / rounds
+
+        # What the endpoint would cost without indexes: a full scan
+        city = filters.get("city")
+        low = filters.get("min_age", 0)
+        high = filters.get("max_age", 1000)
+        start = time.perf_counter()
+        matches = [
+            user for shard in store.shards for user in shard.records.values()
+            if (city is None or user["city"] == city)
+            and low <= user["age"] <= high
+        ]
+        scan = time.perf_counter() - start
+        print(f"{label:<24}{indexed * 1e6:>12.1f}{scan * 1e3:>10.1f}"
+              f"{len(matches):>10}")
+
+
+def cmd_stress(args):
+    # Mixed traffic against one UserStore from N threads: --write-ratio
+    # add_user calls, the rest split between GET /users/<name> lookups and
+    # /data pages. With --log writes go through the fsynced LogBackend.
+    thread_counts = [int(n) for n in args.threads.split(",")]
+    shard_counts = [int(n) for n in args.shards.split(",")]
+    names = [f"user{i:08d}" for i in range(args.users)]
+    seed = {name: {"username": name, "name": name, "age": 20 + i % 50,
+                   "city": f"City{i % 100}"}
+            for i, name in enumerate(names)}
+
+    print(f"{args.users} users, {args.write_ratio:.0%} writes, "
+          f"{args.duration:g}s per cell, "
+          f"backend={'log (fsync)' if args.log else 'memory'}")
+    print(f"{'shards':<8}" + "".join(f"{n:>10}" for n in thread_counts)
+          + "   ops/s by thread count")
+    for shards in shard_counts:
+        row = []
+        for threads in thread_counts:
+            with tempfile.TemporaryDirectory() as path:
+                backend = LogBackend(path) if args.log else None
+                store = user_store.UserStore(backend, shards=shards)
+                store.load([seed])
+                row.append(stress_run(store, names, threads, args))
+                store.close()
+        print(f"{shards:<8}" + "".join(f"{ops:>10,.0f}" for ops in row))
+
+
+def stress_run(store, names, threads, args):
+    done = [0] * threads
+    stop = threading.Event()
+
+    def worker(slot):
+        rng = random.Random(slot)
+        count = 0
+        while not stop.is_set():
+            name = names[rng.randrange(len(names))]
+            roll = rng.random()
+            if roll < args.write_ratio:
+                store[name] = {"username": name, "name": name,
+                               "age": rng.randint(18, 90),
+                               "city": f"City{rng.randrange(100)}"}
+            elif roll < 0.9:
+                store.get(name)
+            else:
+                store.page(name, 20)
+            count += 1
+        done[slot] = count
+
+    workers = [threading.Thread(target=worker, args=(slot,))
+               for slot in range(threads)]
+    for thread in workers:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    return sum(done) / args.duration
+
+
+STARTUP_PROBE = """
+import time
+start = time.perf_counter()
+import task_05_basic_security as m
+imported = time.perf_counter()
+m.users.get("user1")
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def cmd_startup(args):
+    # Fresh interpreter per run: the import is what a worker pays at boot,
+    # the first lookup is where the user table is actually loaded
+    print(f"{'users':>9} {'import ms':>10} {'first lookup ms':>16}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (int(n) for n in args.users.split(",")):
+            env = dict(os.environ)
+            env.pop("AUTH_USERS_FILE", None)
+            if count:
+                # Cheapest hash method: the benchmark is about loading
+                path = os.path.join(tmp, f"users-{count}.ndjson")
+                subprocess.run(
+                    [sys.executable, "user_credentials.py", path,
+                     "--demo", str(count), "--method", "pbkdf2:sha256:1"],
+                    cwd=HERE, check=True, stdout=subprocess.DEVNULL)
+                env["AUTH_USERS_FILE"] = path
+            runs = []
+            for _ in range(args.repeat):
+                out = subprocess.run(
+                    [sys.executable, "-c", STARTUP_PROBE], cwd=HERE, env=env,
+                    check=True, capture_output=True, text=True).stdout
+                runs.append([float(x) * 1000 for x in out.split()])
+            imported = min(run[0] for run in runs)
+            lookup = min(run[1] for run in runs)
+            label = count or "demo"
+            print(f"{label:>9} {imported:>10.1f} {lookup:>16.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_load_options(sub):
+        sub.add_argument("--concurrency", type=int, default=50,
+                         help="clients (closed loop) or max in flight")
+        sub.add_argument("--rate", type=float,
+                         help="open loop: requests per second")
+        sub.add_argument("--duration", type=float, default=5.0,
+                         help="seconds per endpoint")
+
+    load = commands.add_parser("load", help="per-endpoint latency report")
+    load.add_argument("--server", choices=SCENARIOS, default="http")
+    load.add_argument("--mode", choices=api.MODES, default="threaded",
+                      help="task_03 serving mode (http server only)")
+    load.add_argument("--endpoint", action="append",
+                      help='only measure this label, e.g. "GET /data"')
+    load.add_argument("--save", help="write results to this JSON file")
+    load.add_argument("--compare", help="diff against a saved JSON run")
+    load.add_argument("--tolerance", type=float, default=10.0,
+                      help="allowed req/s drop or p99 rise, in percent")
+    add_load_options(load)
+
+    modes = commands.add_parser("modes", help="task_03 serving modes")
+    modes.add_argument("--path", default="/data")
+    modes.add_argument("--no-reuse", action="store_true",
+                       help="open a new connection for every request")
+    add_load_options(modes)
+
+    compression = commands.add_parser("compression", help="gzip on/off")
+    compression.add_argument("--records", type=int, default=2000,
+                             help="size of the JSON payload")
+    add_load_options(compression)
+
+    commands.add_parser("metrics", help="metrics recording overhead")
+
+    ingest = commands.add_parser("ingest", help="bulk NDJSON ingestion")
+    ingest.add_argument("--users", type=int, default=200000)
+
+    query = commands.add_parser("query", help="indexed user filters")
+    query.add_argument("--users", type=int, default=1000000)
+
+    stress = commands.add_parser("stress", help="UserStore under threads")
+    stress.add_argument("--threads", default="1,2,4,8,16",
+                        help="comma-separated thread counts")
+    stress.add_argument("--shards", default=f"1,{user_store.SHARDS}",
+                        help="comma-separated shard counts to compare")
+    stress.add_argument("--users", type=int, default=100000)
+    stress.add_argument("--write-ratio", type=float, default=0.2)
+    stress.add_argument("--duration", type=float, default=2.0)
+    stress.add_argument("--log", action="store_true",
+                        help="durable LogBackend instead of memory")
+
+    startup = commands.add_parser("startup", help="task_05 boot cost")
+    startup.add_argument("--users", default="0,1000,100000",
+                         help="comma-separated user counts (0: demo users)")
+    startup.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    handler = {
+        "load": cmd_load, "modes": cmd_modes,
+        "compression": cmd_compression, "metrics": cmd_metrics,
+        "ingest": cmd_ingest, "query": cmd_query, "stress": cmd_stress,
+        "startup": cmd_startup,
+    }[args.command]
+    sys.exit(handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cache of successful password verifications for Basic Auth.
+
+check_password_hash() is slow on purpose (PBKDF2/scrypt), and Basic Auth
+sends the same credentials with every request. After one successful check
+we remember an HMAC of (username, password, stored hash) under a random
+per-process key; a later request with the same credentials recomputes the
+HMAC (microseconds) and compares it with hmac.compare_digest() instead of
+re-running the password hash.
+
+- The plaintext password is never stored, and the digest is useless
+  outside this process: the key is never persisted.
+- The stored hash is part of the HMAC input, so changing a user's
+  password makes their cached entry miss even before invalidate() is
+  called.
+- Only successes are cached; a wrong password always pays the full hash,
+  so the cache does not make guessing cheaper.
+- Entries expire after ttl seconds and the least recently used one is
+  evicted beyond max_entries.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CredentialCache:
+    """Thread-safe TTL + LRU cache of verified credentials per username."""
+
+    def __init__(self, ttl=300.0, max_entries=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.key = os.urandom(32)
+        self.entries = OrderedDict()    # username -> (digest, expires)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _digest(self, username, password, stored_hash):
+        message = "\0".join((username, password, stored_hash)).encode()
+        return hmac.new(self.key, message, hashlib.sha256).digest()
+
+    def check(self, username, password, stored_hash):
+        """True if these credentials were verified within the last ttl."""
+        digest = self._digest(username, password, stored_hash)
+        with self.lock:
+            found = self.entries.get(username)
+            if found is None:
+                self.misses += 1
+                return False
+            cached, expires = found
+            if expires <= self.clock():
+                del self.entries[username]
+                self.expired += 1
+                self.misses += 1
+                return False
+            if not hmac.compare_digest(cached, digest):
+                self.misses += 1
+                return False
+            self.entries.move_to_end(username)
+            self.hits += 1
+            return True
+
+    def add(self, username, password, stored_hash):
+        """Remember credentials that check_password_hash() just accepted."""
+        digest = self._digest(username, password, stored_hash)
+        with self.lock:
+            self.entries.pop(username, None)
+            self.entries[username] = (digest, self.clock() + self.ttl)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username):
+        """Forget ``username``, e.g. after their password changed."""
+        with self.lock:
+            if self.entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
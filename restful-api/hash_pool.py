@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Bounded thread pool for password hashing and verification.
+
+Password hashes are slow on purpose. Run inline, a burst of logins keeps
+every request thread busy hashing and cheap requests (a JWT check) queue
+behind them. HashPool runs hashing on its own few threads instead:
+
+- at most ``workers`` hashes run at once; hashlib releases the GIL while
+  it hashes, so they use that many cores and leave the rest (and the
+  interpreter) to other requests;
+- at most ``max_pending`` jobs are running or queued; beyond that run()
+  raises PoolBusy at once, so a burst is shed (503) instead of piling up
+  blocked request threads;
+- queue wait and run time are measured for stats().
+
+Flask views are synchronous, so callers block on the job's future; the
+bound on pending jobs is what keeps those waits short.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolBusy(Exception):
+    """Raised by HashPool.run() when max_pending jobs are already queued."""
+
+
+class HashPool:
+    """ThreadPoolExecutor with a bounded backlog and queue metrics."""
+
+    def __init__(self, workers=None, max_pending=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max(max_pending, self.workers)
+        self.executor = ThreadPoolExecutor(self.workers,
+                                           thread_name_prefix="hash")
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.running = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+
+    def run(self, fn, *args):
+        """Call fn(*args) on a hashing thread and return its result."""
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise PoolBusy("password hashing backlog is full")
+        with self.lock:
+            self.submitted += 1
+        try:
+            future = self.executor.submit(self._job, time.perf_counter(),
+                                          fn, args)
+        except BaseException:
+            self.slots.release()
+            raise
+        return future.result()
+
+    def _job(self, queued_at, fn, args):
+        started = time.perf_counter()
+        waited = started - queued_at
+        with self.lock:
+            self.running += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+                self.run_total += elapsed
+            self.slots.release()
+
+    def stats(self):
+        with self.lock:
+            done = self.completed
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "running": self.running,
+                "queued": self.submitted - done - self.running,
+                "submitted": self.submitted,
+                "completed": done,
+                "rejected": self.rejected,
+                "avg_wait_ms": self.wait_total / done * 1000 if done else 0.0,
+                "max_wait_ms": self.wait_max * 1000,
+                "avg_run_ms": self.run_total / done * 1000 if done else 0.0,
+            }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Low-overhead per-route request metrics with Prometheus text exposition.
+
+Each thread records into its own shard, so the request path takes no lock:
+one thread-local lookup, a few integer additions and a histogram bucket
+increment. Shards are only combined when /metrics is scraped. Shards of
+threads that have exited are folded into a retired total, so per-connection
+threads (ThreadingHTTPServer) do not make the registry grow without bound.
+
+Latency is kept in a log-linear histogram (HDR style): every power-of-two
+range of microseconds is split into SUB_BUCKETS linear buckets, bounding
+the relative error at 1 / SUB_BUCKETS while staying a flat list of ints.
+"""
+
+import threading
+
+SUB_BITS = 2
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_MICROS = (1 << 36) - 1          # ~19 hours, larger values are clamped
+COMPACT_AFTER = 256                 # fold dead shards past this many
+
+
+def bucket_index(micros: int) -> int:
+    if micros < SUB_BUCKETS:
+        return micros
+    if micros > MAX_MICROS:
+        micros = MAX_MICROS
+    shift = micros.bit_length() - SUB_BITS - 1
+    return ((shift + 1) << SUB_BITS) + (micros >> shift) - SUB_BUCKETS
+
+
+def bucket_upper(index: int) -> int:
+    """Exclusive upper bound, in microseconds, of bucket ``index``."""
+    if index < SUB_BUCKETS:
+        return index + 1
+    shift = (index >> SUB_BITS) - 1
+    return ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS + 1) << shift
+
+
+BUCKETS = bucket_index(MAX_MICROS) + 1
+
+
+class Series:
+    """Counters for one route, written by a single thread."""
+
+    __slots__ = ("count", "bytes", "micros", "statuses", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.micros = 0
+        self.statuses = {}
+        self.buckets = [0] * BUCKETS
+
+    def merge(self, other):
+        self.count += other.count
+        self.bytes += other.bytes
+        self.micros += other.micros
+        # list(): the owning thread may add a status while we read
+        for status, count in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        buckets = self.buckets
+        for index, count in enumerate(other.buckets):
+            if count:
+                buckets[index] += count
+
+    def quantile(self, q: float) -> float:
+        """Approximate latency quantile in seconds (bucket upper bound)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return bucket_upper(index) / 1e6
+        return MAX_MICROS / 1e6
+
+
+class Metrics:
+    """Registry of per-thread shards, each a {route: Series} dict."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []        # [(thread, {route: Series})]
+        self.retired = {}
+        self.collectors = {}    # name -> (type, help, read callable)
+
+    def _shard(self):
+        shard = {}
+        with self.lock:
+            if len(self.shards) >= COMPACT_AFTER:
+                self._compact()
+            self.shards.append((threading.current_thread(), shard))
+        self.local.shard = shard
+        return shard
+
+    def _compact(self):
+        """Fold shards of exited threads into ``retired`` (lock held)."""
+        live = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+                continue
+            for route, series in shard.items():
+                self.retired.setdefault(route, Series()).merge(series)
+        self.shards = live
+
+    def record(self, route: str, status: int, size: int, seconds: float):
+        try:
+            shard = self.local.shard
+        except AttributeError:
+            shard = self._shard()
+        series = shard.get(route)
+        if series is None:
+            series = shard[route] = Series()
+        micros = int(seconds * 1e6)
+        series.count += 1
+        series.bytes += size
+        series.micros += micros
+        statuses = series.statuses
+        statuses[status] = statuses.get(status, 0) + 1
+        series.buckets[bucket_index(micros)] += 1
+
+    def register(self, name: str, kind: str, help_text: str, read):
+        """Expose a value read at scrape time, e.g. a queue depth gauge."""
+        with self.lock:
+            self.collectors[name] = (kind, help_text, read)
+
+    def snapshot(self) -> dict:
+        """Totals per route, merged from every shard."""
+        with self.lock:
+            self._compact()
+            totals = {}
+            for route, series in self.retired.items():
+                totals.setdefault(route, Series()).merge(series)
+            for _, shard in self.shards:
+                # list() so a thread adding a route mid-scrape is harmless
+                for route, series in list(shard.items()):
+                    totals.setdefault(route, Series()).merge(series)
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        totals = sorted(self.snapshot().items())
+        lines = [
+            "# HELP http_requests_total Requests served by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for route, series in totals:
+            for status, count in sorted(series.statuses.items()):
+                lines.append(
+                    f'http_requests_total{{route="{route}",'
+                    f'status="{status}"}} {count}'
+                )
+        lines += [
+            "# HELP http_response_bytes_total Response bytes sent by route.",
+            "# TYPE http_response_bytes_total counter",
+        ]
+        for route, series in totals:
+            lines.append(
+                f'http_response_bytes_total{{route="{route}"}} {series.bytes}'
+            )
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for route, series in totals:
+            # Expose octave boundaries only; they are exact bucket edges
+            cumulative = 0
+            for index, count in enumerate(series.buckets):
+                cumulative += count
+                upper = index + 1
+                if upper % SUB_BUCKETS == 0 and upper < BUCKETS:
+                    le = bucket_upper(index) / 1e6
+                    lines.append(
+                        f'http_request_duration_seconds_bucket{{route='
+                        f'"{route}",le="{le}"}} {cumulative}'
+                    )
+            # cumulative, not count: they may differ by an in-flight record
+            lines += [
+                f'http_request_duration_seconds_bucket{{route="{route}",'
+                f'le="+Inf"}} {cumulative}',
+                f'http_request_duration_seconds_sum{{route="{route}"}} '
+                f'{series.micros / 1e6:g}',
+                f'http_request_duration_seconds_count{{route="{route}"}} '
+                f'{cumulative}',
+            ]
+        with self.lock:
+            collectors = sorted(self.collectors.items())
+        for name, (kind, help_text, read) in collectors:
+            lines += [
+                f"# HELP {name} {help_text}",
+                f"# TYPE {name} {kind}",
+                f"{name} {read()}",
+            ]
+        return "\n".join(lines) + "\n"
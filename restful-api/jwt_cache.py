@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+JWTManager that caches the claims of tokens it has already verified.
+
+Clients reuse one bearer token for many requests, and each request would
+otherwise parse, base64-decode and HMAC-verify it again. CachingJWTManager
+overrides the single hook flask_jwt_extended decodes through
+(_decode_jwt_from_config) and keeps verified claims in a small LRU keyed
+by the SHA-256 of the token, so a repeat costs one hash and a dict lookup.
+Tokens themselves are never kept.
+
+- An entry expires at the token's ``exp`` (or after max_age if that is
+  sooner, or if there is none); after that the token is verified for real
+  again, which rejects it as expired.
+- Revocation still applies: flask_jwt_extended calls the blocklist
+  loader, token type and custom claim checks after decoding, on every
+  request, cached or not.
+- Decodes with a CSRF value or allow_expired=True bypass the cache; they
+  check more (or less) than a plain verification.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_jwt_extended import JWTManager
+
+
+class ClaimsCache:
+    """Thread-safe LRU of token digest -> (claims, expires at)."""
+
+    def __init__(self, max_entries=4096, max_age=300.0, clock=time.time):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            found = self.entries.get(key)
+            if found is None:
+                self.misses += 1
+                return None
+            claims, expires = found
+            if expires <= self.clock():
+                del self.entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, key, claims):
+        expires = self.clock() + self.max_age
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            expires = min(expires, exp)
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (claims, expires)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop everything, e.g. after rotating JWT_SECRET_KEY."""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+class CachingJWTManager(JWTManager):
+    """JWTManager whose token verification is memoised in a ClaimsCache."""
+
+    def __init__(self, app=None, max_entries=4096, max_age=300.0, **kwargs):
+        self.claims_cache = ClaimsCache(max_entries, max_age)
+        super().__init__(app, **kwargs)
+
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None,
+                                allow_expired=False):
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(
+                encoded_token, csrf_value, allow_expired)
+        # The app is part of the key: its config holds the secret
+        key = (id(current_app._get_current_object()),
+               hashlib.sha256(encoded_token.encode()).digest())
+        claims = self.claims_cache.get(key)
+        if claims is None:
+            claims = super()._decode_jwt_from_config(encoded_token)
+            self.claims_cache.put(key, claims)
+        # A copy, so a view changing its claims cannot change the cache
+        return dict(claims)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+LRU cache of encoded response bodies with a byte budget.
+
+Read-heavy routes encode the same unchanged objects over and over; this
+keeps the encoded bytes (and a strong ETag over them) so a hit is a dict
+lookup. Entries are evicted least-recently-used first once their total
+size exceeds max_bytes.
+
+Writers call invalidate(key) after changing the underlying data. A reader
+that missed takes token(key) *before* reading the data and passes it to
+put(); if an invalidation happened in between, put() does not store the
+now-stale body. Tokens are per stripe (hash(key) % STRIPES), so memory
+stays bounded however many keys pass through.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+STRIPES = 256
+# Rough per-entry bookkeeping (dict slot, tuple, key) on top of the body
+ENTRY_OVERHEAD = 200
+
+Entry = namedtuple("Entry", ["body", "etag"])
+
+
+def etag_for(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe LRU of Entry(body, etag) bounded by total bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()    # key -> (Entry, size)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.epochs = [0] * STRIPES
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Cached Entry for ``key`` or None; a hit makes it most recent."""
+        with self.lock:
+            found = self.entries.get(key)
+            if found is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return found[0]
+
+    def token(self, key):
+        """Take before reading the data a body will be built from."""
+        return self.epochs[hash(key) % STRIPES]
+
+    def put(self, key, body: bytes, token):
+        """Cache ``body`` unless ``key`` was invalidated since ``token``.
+
+        Returns the Entry either way, so the caller can serve it.
+        """
+        entry = Entry(body, etag_for(body))
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return entry
+        with self.lock:
+            if self.epochs[hash(key) % STRIPES] != token:
+                return entry
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self.entries[key] = (entry, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, *keys):
+        """Drop ``keys`` and fence off bodies built before this call."""
+        with self.lock:
+            for key in keys:
+                self.epochs[hash(key) % STRIPES] += 1
+                old = self.entries.pop(key, None)
+                if old is not None:
+                    self.size -= old[1]
+                    self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            for stripe in range(STRIPES):
+                self.epochs[stripe] += 1
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Shared-memory backend for UserStore: one user table for many processes.
+
+Every worker process maps the same file (put it on /dev/shm for pure
+shared memory, or on disk to also survive restarts) and keeps its own
+UserStore with indexes on top. The file is an append-only record log:
+
+  header   magic(8) | committed bytes(8) | record count(8)
+  record   length(4) | crc32(4) | seq(8) | payload(length)
+
+Writers serialise on an exclusive flock(), copy their records past the
+committed mark, then publish them by storing the new committed mark
+last. flock() is per open file, not per thread, so threads of one
+process first take the backend's own lock, and a forked process (a
+pre-forking server that built the store before forking) opens the file
+again before its first write rather than sharing the parent's lock.
+Lookups never lock: they read the UserStore, and poll() only compares
+the committed mark with what this process has applied; decoding new
+records (which no writer touches again) is serialised per process. A
+process skips the records it wrote itself, which it applied when writing
+them. Each record carries a crc32, so a record read before its bytes are
+visible (the seqlock case) is simply retried on the next poll. seq
+numbers are global and strictly increasing, so every process applies
+racing writes to a username in the same order.
+
+Payloads are packed binary for the usual shape of user (string name and
+city, integer age) and fall back to JSON for anything else.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import deque
+
+MAGIC = b"USERSHM1"
+HEADER = struct.Struct("<8sQQ")
+COMMITTED = struct.Struct("<Q")         # at offset 8 of the header
+RECORD = struct.Struct("<IIQ")
+INITIAL_SIZE = 64 * 1024 * 1024
+POLL_BATCH = 10000
+
+# Payload kinds and the age encodings of the compact kind
+COMPACT, JSON = 0, 1
+AGE_NONE, AGE_INT = 0, 1
+NO_STRING = 0xFFFFFFFF
+INT64 = struct.Struct("<q")
+U32 = struct.Struct("<I")
+INT64_RANGE = range(-2 ** 63, 2 ** 63)
+
+
+def _pack_str(value):
+    if value is None:
+        return U32.pack(NO_STRING)
+    data = value.encode()
+    return U32.pack(len(data)) + data
+
+
+def encode_user(user):
+    """Pack a user dict into record payload bytes."""
+    age = user.get("age")
+    strings = (user["username"], user.get("name"), user.get("city"))
+    compact = (
+        set(user) <= {"username", "name", "age", "city"}
+        and all(s is None or isinstance(s, str) for s in strings)
+        and (age is None or (type(age) is int and age in INT64_RANGE))
+    )
+    if not compact:
+        return bytes((JSON,)) + json.dumps(user).encode()
+    if age is None:
+        head = bytes((COMPACT, AGE_NONE))
+    else:
+        head = bytes((COMPACT, AGE_INT)) + INT64.pack(age)
+    return head + b"".join(_pack_str(s) for s in strings)
+
+
+def decode_user(payload):
+    """Inverse of encode_user()."""
+    if payload[0] == JSON:
+        return json.loads(bytes(payload[1:]))
+    pos = 2
+    age = None
+    if payload[1] == AGE_INT:
+        age = INT64.unpack_from(payload, pos)[0]
+        pos += INT64.size
+    strings = []
+    for _ in range(3):
+        size = U32.unpack_from(payload, pos)[0]
+        pos += U32.size
+        if size == NO_STRING:
+            strings.append(None)
+        else:
+            strings.append(bytes(payload[pos:pos + size]).decode())
+            pos += size
+    username, name, city = strings
+    return {"username": username, "name": name, "age": age, "city": city}
+
+
+class SharedMemoryBackend:
+    """Multi-process user table in the mmap'd file at ``path``."""
+
+    shared = True
+
+    def __init__(self, path, initial_size=INITIAL_SIZE):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        with self._locked():
+            if os.fstat(self.fd).st_size < HEADER.size:
+                os.ftruncate(self.fd, max(initial_size, HEADER.size))
+                os.pwrite(self.fd, HEADER.pack(MAGIC, 0, 0), 0)
+        self.map = None
+        self._remap()
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a users shared-memory file")
+        self.offset = 0         # bytes of the record area applied here
+        self.own = deque()      # (start, end) of records written here
+
+    def _locked(self):
+        return _FileLock(self)
+
+    def _reopen(self):
+        # Not lockf(): every mmap holds a dup of the fd, and closing any
+        # descriptor of the file drops the process's lockf() locks
+        fd = os.open(self.path, os.O_RDWR)
+        os.close(self.fd)
+        self.fd, self.pid = fd, os.getpid()
+
+    def _remap(self):
+        # The old map is not closed: a lock-free poll() may still be
+        # reading it, and it is unmapped once the last reference goes
+        self.map = mmap.mmap(self.fd, os.fstat(self.fd).st_size)
+
+    def _committed(self):
+        return COMMITTED.unpack_from(self.map, 8)[0]
+
+    # --- reads -------------------------------------------------------------
+    def load(self):
+        """Yield {username: user} batches of every record so far (before
+        the backend is shared between threads)."""
+        batch = {}
+        for _, user in self._read_new():
+            batch[user["username"]] = user
+            if len(batch) >= POLL_BATCH:
+                yield batch
+                batch = {}
+        yield batch
+
+    def poll(self):
+        """(seq, user) for every record published since the last call."""
+        if COMMITTED.unpack_from(self.map, 8)[0] == self.offset:
+            return ()           # the per-request common case
+        with self.lock:
+            return list(self._read_new())
+
+    def _read_new(self):
+        committed = self._committed()
+        if HEADER.size + committed > len(self.map):
+            self._remap()       # another process grew the file
+        data = self.map
+        pos = HEADER.size + self.offset
+        end = HEADER.size + committed
+        own = self.own
+        while pos + RECORD.size <= end:
+            if own and own[0][0] == pos - HEADER.size:
+                pos = HEADER.size + own.popleft()[1]
+                self.offset = pos - HEADER.size
+                continue
+            length, crc, seq = RECORD.unpack_from(data, pos)
+            start = pos + RECORD.size
+            if start + length > end:
+                break
+            payload = data[start:start + length]
+            if zlib.crc32(payload) != crc:
+                break           # not fully visible yet; next poll
+            yield seq, decode_user(payload)
+            pos = start + length
+            self.offset = pos - HEADER.size
+
+    # --- writes --------------------------------------------------------------
+    def append(self, user):
+        return self.append_many((user,))
+
+    def append_many(self, users):
+        """Publish users; returns the seq of the first, the rest follow."""
+        payloads = [encode_user(user) for user in users]
+        size = sum(RECORD.size + len(p) for p in payloads)
+        with self._locked():
+            _, committed, count = HEADER.unpack_from(self.map, 0)
+            end = HEADER.size + committed + size
+            if end > os.fstat(self.fd).st_size:
+                os.ftruncate(self.fd, max(end, 2 * len(self.map)))
+            if end > len(self.map):
+                self._remap()
+            data = self.map
+            pos = HEADER.size + committed
+            for seq, payload in enumerate(payloads, count + 1):
+                RECORD.pack_into(data, pos, len(payload),
+                                 zlib.crc32(payload), seq)
+                pos += RECORD.size
+                data[pos:pos + len(payload)] = payload
+                pos += len(payload)
+            # Count first, committed mark last: publishing is that store
+            struct.pack_into("<Q", data, 16, count + len(payloads))
+            COMMITTED.pack_into(data, 8, committed + size)
+            # Applied by the caller already: poll() must not repeat them
+            if self.offset == committed:
+                self.offset = committed + size
+            else:
+                self.own.append((committed, committed + size))
+        return count + 1
+
+    def close(self):
+        if self.map is not None:
+            self.map = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class _FileLock:
+    """The backend's lock for the threads of this process, then an
+    exclusive flock() on its file for the other processes, as a context
+    manager."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __enter__(self):
+        backend = self.backend
+        backend.lock.acquire()
+        try:
+            if backend.pid != os.getpid():
+                backend._reopen()   # the inherited fd shares our flock()
+            fcntl.flock(backend.fd, fcntl.LOCK_EX)
+        except BaseException:
+            backend.lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        backend = self.backend
+        try:
+            fcntl.flock(backend.fd, fcntl.LOCK_UN)
+        finally:
+            backend.lock.release()
@@ -1,65 +1,880 @@
 #!/usr/bin/env python3
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from urllib.parse import urlparse
+from http.server import (
+    BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer,
+)
+import argparse
+import asyncio
+import email.utils
+import gzip
+import hashlib
+import html
 import json
+import mimetypes
+import os
+import queue
+import signal
+import socket
+import stat
+import threading
+import time
+import zlib
+
+from http_metrics import Metrics
+from http_router import Router
 
 HOST = "127.0.0.1"
 PORT = 8000
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Serving engines selectable at startup (see run() and --mode), all
+# listening with the same accept backlog so they differ only in engine
+MODES = ("threaded", "async", "prefork", "pool")
+ACCEPT_BACKLOG = 1024
+
+# HTTP/1.1 persistent connections: idle seconds before an open connection is
+# dropped, and requests served on one connection before it is closed.
+KEEPALIVE_TIMEOUT = 5
+MAX_KEEPALIVE_REQUESTS = 1000
+MAX_DISCARD_BODY = 65536
+
+
+# --- responses ---------------------------------------------------------------
+def text_body(status: int, text: str):
+    # Keep it simple for tests: plain text only
+    return status, "text/plain", text.encode("utf-8")
+
+
+def json_body(status: int, obj):
+    # Tests expect application/json (no charset)
+    return status, "application/json", json.dumps(obj).encode("utf-8")
+
+
+def not_found():
+    # For undefined endpoints, tests expect *plain text* exactly:
+    # "Endpoint not found"
+    return text_body(404, "Endpoint not found")
+
+
+# --- response cache ----------------------------------------------------------
+# Immutable routes are rendered, JSON-encoded and framed exactly once at
+# import; requests are then answered from bytes. Only the Date header
+# changes, and it is re-rendered at most once per second.
+_date = (0, b"")
+
+
+def date_header() -> bytes:
+    global _date
+    now = int(time.time())
+    if _date[0] != now:
+        stamp = email.utils.formatdate(now, usegmt=True)
+        _date = (now, f"Date: {stamp}\r\n".encode("latin-1"))
+    return _date[1]
+
+
+def status_line(status: int, reason: str = None) -> bytes:
+    """Status line plus the Server header send_response() would emit."""
+    handler = SimpleAPIHandler
+    if reason is None:
+        reason = handler.responses.get(status, ("",))[0]
+    return (
+        f"{handler.protocol_version} {status} {reason}\r\n"
+        f"Server: {handler.server_version} {handler.sys_version}\r\n"
+    ).encode("latin-1")
+
+
+def status_head(status: int, reason: str = None) -> bytes:
+    return status_line(status, reason) + date_header()
+
+
+# --- compression -------------------------------------------------------------
+# Bodies below the threshold gain little and cost a compressor call; larger
+# ones are compressed once per coding and reused (see CachedResponse).
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = ("text/plain", "application/json", "text/csv")
+COMPRESSORS = {
+    "gzip": lambda data: gzip.compress(data, COMPRESS_LEVEL, mtime=0),
+    "deflate": lambda data: zlib.compress(data, COMPRESS_LEVEL),
+}
+_negotiated = {}
+
+
+def negotiate_encoding(accept_encoding: str):
+    """Pick the preferred coding we support, or None for identity.
+
+    Clients send a handful of distinct header values, so results are
+    memoized per header string.
+    """
+    coding = _negotiated.get(accept_encoding, False)
+    if coding is not False:
+        return coding
+    listed, star = {}, None
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name == "*":
+            star = q
+        else:
+            listed.setdefault(name, q)
+    # "*" only covers codings the header does not name: "gzip;q=0, *"
+    # still refuses gzip
+    candidates = [(name, q) for name, q in listed.items()
+                  if name in COMPRESSORS]
+    if star is not None:
+        candidates += [(name, star) for name in COMPRESSORS
+                       if name not in listed]
+    best, best_q = None, 0.0
+    for name, q in candidates:
+        if q > best_q:
+            best, best_q = name, q
+    if len(_negotiated) < 256:
+        _negotiated[accept_encoding] = best
+    return best
+
+
+class Variant:
+    """One content-coding of a response: its body, ETag and header block."""
+
+    __slots__ = ("body", "etag", "headers", "not_modified_headers")
+
+    def __init__(self, content_type, body, etag, coding=None, extra="",
+                 vary=""):
+        self.body = body
+        self.etag = etag
+        etag_header = f"ETag: {etag}\r\n" if etag else ""
+        coding_header = f"Content-Encoding: {coding}\r\n" if coding else ""
+        self.headers = (
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{coding_header}{etag_header}{vary}{extra}"
+        ).encode("latin-1")
+        # A 304 repeats the validator and Vary of the 200 it stands for
+        self.not_modified_headers = f"{etag_header}{vary}".encode("latin-1")
+
+
+class CachedResponse:
+    """A response serialized once, with a strong ETag for 2xx bodies.
+
+    Compressible bodies also get gzip/deflate variants, each built the first
+    time a client asks for it and then kept alongside the identity body.
+    """
+
+    def __init__(self, status: int, content_type: str, body: bytes,
+                 headers: dict = None):
+        self.status = status
+        self.content_type = content_type
+        self.etag = None
+        if 200 <= status < 300:
+            digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+            self.etag = f'"{digest}"'
+        self.compressible = (
+            len(body) >= COMPRESS_MIN_SIZE
+            and content_type.split(";")[0] in COMPRESSIBLE_TYPES
+        )
+        self.extra = "".join(
+            f"{name}: {value}\r\n" for name, value in (headers or {}).items()
+        )
+        self.vary = "Vary: Accept-Encoding\r\n" if self.compressible else ""
+        self.status_line = status_line(status)
+        self.not_modified = status_line(304)
+        self.identity = Variant(content_type, body, self.etag,
+                                extra=self.extra, vary=self.vary)
+        self.variants = {None: self.identity}
+
+    @property
+    def body(self) -> bytes:
+        return self.identity.body
+
+    def variant(self, coding: str) -> Variant:
+        """The body in ``coding``, compressed on first use only."""
+        found = self.variants.get(coding)
+        if found is not None:
+            return found
+        body = COMPRESSORS[coding](self.identity.body)
+        if len(body) < len(self.identity.body):
+            etag = self.etag and f'{self.etag[:-1]}-{coding}"'
+            found = Variant(self.content_type, body, etag, coding,
+                            self.extra, self.vary)
+        else:
+            found = self.identity
+        # Benign race: two threads may compress once each, both results match
+        self.variants[coding] = found
+        return found
+
+    def is_fresh(self, variant: Variant, if_none_match: str) -> bool:
+        """True when If-None-Match already names this body (RFC 9110)."""
+        if variant.etag is None or not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == variant.etag:
+                return True
+        return False
+
+    def encode(self, if_none_match: str = None, extra: bytes = b"",
+               accept_encoding: str = None) -> bytes:
+        """Frame the response; ``extra`` holds pre-encoded header lines."""
+        variant = self.identity
+        if self.compressible and accept_encoding:
+            variant = self.variant(negotiate_encoding(accept_encoding))
+        if self.is_fresh(variant, if_none_match):
+            return b"".join((
+                self.not_modified, date_header(),
+                variant.not_modified_headers, extra, b"\r\n",
+            ))
+        return b"".join((
+            self.status_line, date_header(), variant.headers, extra,
+            b"\r\n", variant.body,
+        ))
+
+
+# --- persistent connections --------------------------------------------------
+CLOSE = b"Connection: close\r\n"
+KEEP_ALIVE = b"Connection: keep-alive\r\n"
+
+
+def wants_keep_alive(version: str, connection: str) -> bool:
+    """HTTP/1.1 persists unless told otherwise; HTTP/1.0 must opt in."""
+    connection = (connection or "").lower()
+    if "close" in connection:
+        return False
+    if version == "HTTP/1.1":
+        return True
+    return version == "HTTP/1.0" and "keep-alive" in connection
 
 
 class SimpleAPIHandler(BaseHTTPRequestHandler):
+    # Every response carries Content-Length, so connections can be reused;
+    # pipelined requests are read in order from the buffered rfile.
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    # TCP_NODELAY: a file's head and its sendfile() body are two sends,
+    # and Nagle would hold the second until the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.requests_served = 0
+
     # --- helpers -------------------------------------------------------------
+    def connection_header(self) -> bytes:
+        """Count this response and decide whether it ends the connection."""
+        self.requests_served += 1
+        if self.requests_served >= MAX_KEEPALIVE_REQUESTS:
+            self.close_connection = True
+        elif not self.discard_body():
+            self.close_connection = True
+        elif getattr(self.server, "saturated", False):
+            # Hand this pool worker to a queued connection instead
+            self.close_connection = True
+        if self.close_connection:
+            return CLOSE
+        if self.request_version != "HTTP/1.1":
+            return KEEP_ALIVE
+        return b""
+
+    def discard_body(self) -> bool:
+        """Skip a small request body so the next request parses cleanly."""
+        if "Transfer-Encoding" in self.headers:
+            return False
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            return False
+        if length > MAX_DISCARD_BODY:
+            return False
+        if length > 0:
+            self.rfile.read(length)
+        return True
+
+    def write_body(self, status: int, content_type: str, data: bytes):
+        self.write_cached(CachedResponse(status, content_type, data))
+
     def write_text(self, status: int, text: str):
-        data = text.encode("utf-8")
-        self.send_response(status)
-        # Keep it simple for tests: plain text only
-        self.send_header("Content-Type", "text/plain")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+        self.write_body(*text_body(status, text))
 
     def write_json(self, status: int, obj):
-        data = json.dumps(obj).encode("utf-8")
-        self.send_response(status)
-        # Tests expect application/json (no charset)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
+        self.write_body(*json_body(status, obj))
+
+    def write_cached(self, entry: CachedResponse) -> bytes:
+        connection = self.connection_header()
+        data = entry.encode(
+            self.headers.get("If-None-Match"), connection,
+            self.headers.get("Accept-Encoding"),
+        )
+        self.log_request(entry.status)
         self.wfile.write(data)
+        return data
 
     # --- routing -------------------------------------------------------------
+    def write_file(self, entry):
+        """Send the head, then let the kernel copy the file to the socket."""
+        status, head, offset, count = entry.plan(
+            self.headers.get("If-Modified-Since"),
+            self.headers.get("Range"), self.headers.get("If-Range"),
+        )
+        connection = self.connection_header()
+        self.log_request(status)
+        with entry.file:
+            self.wfile.write(head + connection + b"\r\n")
+            if count:
+                # socket.sendfile() is os.sendfile() plus timeout handling
+                self.connection.sendfile(entry.file, offset, count)
+        return status, len(head) + count
+
     def do_GET(self):
-        path = urlparse(self.path).path
+        started = time.perf_counter()
+        route, entry = dispatch("GET", self.path)
+        if isinstance(entry, FileResponse):
+            status, size = self.write_file(entry)
+        else:
+            data = self.write_cached(entry)
+            # Read back from the framed bytes so 304s count as such
+            status, size = int(data[9:12]), len(data)
+        record_request(route, status, size, started)
 
-        if path == "/":
-            return self.write_text(200, "Hello, this is a simple API!")
+    # Silence default logging (optional)
+    def log_message(self, fmt, *args):
+        return
 
-        if path == "/status":
-            return self.write_text(200, "OK")
 
-        if path == "/data":
-            payload = {"name": "John", "age": 30, "city": "New York"}
-            return self.write_json(200, payload)
+# --- routes ------------------------------------------------------------------
+# Shared by every serving engine so they all answer byte-for-byte alike.
+# Handlers receive the captured path parameters and return a CachedResponse.
+ROUTER = Router()
+NOT_FOUND = CachedResponse(*not_found())
+UNMATCHED = "unmatched"     # metrics label for requests no route matched
 
-        if path == "/info":
-            payload = {
-                "version": "1.0",
-                "description": "A simple API built with http.server",
-            }
-            return self.write_json(200, payload)
 
-        # For undefined endpoints, tests expect *plain text* exactly:
-        # "Endpoint not found"
-        return self.write_text(404, "Endpoint not found")
+def static_route(path: str, response):
+    """Register a GET route whose response never changes."""
+    entry = CachedResponse(*response)
+    ROUTER.add("GET", path, lambda **params: entry)
 
-    # Silence default logging (optional)
-    def log_message(self, fmt, *args):
-        return
 
+static_route("/", text_body(200, "Hello, this is a simple API!"))
+static_route("/status", text_body(200, "OK"))
+static_route("/data", json_body(200, {
+    "name": "John", "age": 30, "city": "New York",
+}))
+static_route("/info", json_body(200, {
+    "version": "1.0",
+    "description": "A simple API built with http.server",
+}))
+
+
+def dispatch(method: str, target: str):
+    """Return (route pattern, CachedResponse) for a request."""
+    match = ROUTER.match(method, target)
+    if match.handler is not None:
+        return match.pattern, match.handler(**match.params)
+    if match.allowed:
+        allow = ", ".join(sorted(match.allowed))
+        return match.pattern, CachedResponse(
+            *text_body(405, "Method not allowed"), headers={"Allow": allow}
+        )
+    return UNMATCHED, NOT_FOUND
+
+
+# --- static files ------------------------------------------------------------
+# /files/<name> streams files from STATIC_ROOT with sendfile(2): the bytes go
+# from the page cache to the socket without passing through Python, so memory
+# use is the same for a 1 KB file and a 10 GB export. Single byte ranges and
+# If-Modified-Since/If-Range revalidation are supported.
+STATIC_ROOT = os.environ.get("STATIC_ROOT", os.path.join(HERE, "static"))
+
+
+class FileResponse:
+    """An open regular file plus the stat() it is served against."""
+
+    def __init__(self, file, st: os.stat_result):
+        self.file = file
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.last_modified = email.utils.formatdate(self.mtime, usegmt=True)
+        self.content_type = (
+            mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+        )
+
+    def not_modified_since(self, if_modified_since: str) -> bool:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return self.mtime <= since.timestamp()
+
+    def byte_range(self, range_header: str):
+        """(start, end) inclusive, None to send it all, or False if the
+        range cannot be satisfied. Multiple ranges are answered in full."""
+        unit, _, spec = range_header.partition("=")
+        if unit.strip().lower() != "bytes" or "," in spec:
+            return None
+        first, sep, last = spec.strip().partition("-")
+        try:
+            if not sep:
+                return None
+            if not first:
+                suffix = int(last)
+                if suffix <= 0 or not self.size:
+                    return False
+                return max(self.size - suffix, 0), self.size - 1
+            start = int(first)
+            end = int(last) if last else self.size - 1
+        except ValueError:
+            return None
+        if start >= self.size:
+            return False
+        if start > end:
+            return None
+        return start, min(end, self.size - 1)
+
+    def plan(self, if_modified_since=None, range_header=None, if_range=None):
+        """Return (status, head bytes minus the blank line, offset, count)."""
+        headers = [
+            f"Last-Modified: {self.last_modified}",
+            "Accept-Ranges: bytes",
+        ]
+        if if_modified_since and self.not_modified_since(if_modified_since):
+            return 304, self._head(304, headers), 0, 0
+        span = None
+        if range_header and (not if_range or if_range == self.last_modified):
+            span = self.byte_range(range_header)
+        if span is False:
+            headers += [
+                f"Content-Range: bytes */{self.size}",
+                "Content-Length: 0",
+            ]
+            return 416, self._head(416, headers), 0, 0
+        status, offset, count = 200, 0, self.size
+        if span is not None:
+            start, end = span
+            status, offset, count = 206, start, end - start + 1
+            headers.append(f"Content-Range: bytes {start}-{end}/{self.size}")
+        headers += [
+            f"Content-Type: {self.content_type}",
+            f"Content-Length: {count}",
+        ]
+        return status, self._head(status, headers), offset, count
+
+    def _head(self, status, headers):
+        lines = "".join(f"{line}\r\n" for line in headers)
+        return status_line(status) + date_header() + lines.encode("latin-1")
+
+
+@ROUTER.route("GET", "/files/<path:name>")
+def static_file(name):
+    if "\0" in name:
+        # os.path and open() raise ValueError for these, not OSError
+        return NOT_FOUND
+    root = os.path.realpath(STATIC_ROOT)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath((root, path)) != root:
+        return NOT_FOUND
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return NOT_FOUND
+    st = os.fstat(file.fileno())
+    if not stat.S_ISREG(st.st_mode):
+        file.close()
+        return NOT_FOUND
+    return FileResponse(file, st)
+
+
+# --- metrics -----------------------------------------------------------------
+# Per-route counts, status codes, bytes and latency histograms, recorded
+# without locks (see http_metrics). In prefork mode each worker reports its
+# own process.
+METRICS = Metrics()
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def record_request(route: str, status: int, size: int, started: float):
+    METRICS.record(route, status, size, time.perf_counter() - started)
+
+
+@ROUTER.route("GET", "/metrics")
+def metrics():
+    body = METRICS.render().encode("utf-8")
+    return CachedResponse(200, METRICS_CONTENT_TYPE, body)
+
+
+# --- threaded mode -----------------------------------------------------------
+class ThreadedHTTPServer(ThreadingHTTPServer):
+    # socketserver listens with a backlog of 5: a burst of new connections
+    # would be timed by SYN retransmits rather than by the server
+    request_queue_size = ACCEPT_BACKLOG
+
+
+# --- asyncio mode ------------------------------------------------------------
+# One event loop multiplexes every connection, so thousands of idle or slow
+# clients cost a few KB each instead of an OS thread each.
+MAX_REQUEST_LINE = 65536
+MAX_HEADERS = 100
+
+
+def encode_error(status: int, message: str = None) -> bytes:
+    """Same HTML error page BaseHTTPRequestHandler.send_error() produces."""
+    handler = SimpleAPIHandler
+    short, explain = handler.responses[status]
+    message = message or short
+    body = (handler.error_message_format % {
+        "code": status, "message": html.escape(message, quote=False),
+        "explain": html.escape(explain, quote=False),
+    }).encode("utf-8", "replace")
+    return b"".join((
+        status_head(status, message),
+        b"Connection: close\r\n",
+        f"Content-Type: {handler.error_content_type}\r\n".encode("latin-1"),
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1"),
+        body,
+    ))
+
+
+async def read_request(reader):
+    """Return (method, target, version, headers) or an error status.
+
+    Header names are lower-cased; repeated headers keep the last value.
+    """
+    try:
+        line = await reader.readuntil(b"\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        return 414
+    words = line.decode("iso-8859-1").split()
+    if len(words) != 3 or not words[2].startswith("HTTP/"):
+        return 400
+
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        try:
+            header = await reader.readuntil(b"\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return 400
+        if header == b"\r\n":
+            return words[0], words[1], words[2], headers
+        name, _, value = header.decode("iso-8859-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return 431
+
+
+async def discard_body(reader, headers) -> bool:
+    if "transfer-encoding" in headers:
+        return False
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        return False
+    if length > MAX_DISCARD_BODY:
+        return False
+    if length > 0:
+        await reader.readexactly(length)
+    return True
+
+
+async def send_file(writer, entry: FileResponse, headers, connection):
+    status, head, offset, count = entry.plan(
+        headers.get("if-modified-since"), headers.get("range"),
+        headers.get("if-range"),
+    )
+    with entry.file:
+        writer.write(head + connection + b"\r\n")
+        if count:
+            # Flushes the head, then uses os.sendfile() on the socket
+            await asyncio.get_running_loop().sendfile(
+                writer.transport, entry.file, offset, count
+            )
+        await writer.drain()
+    return status, len(head) + count
+
+
+async def handle_connection(reader, writer):
+    """Serve requests on one connection until close, cap or idle timeout.
+
+    Pipelined requests sit in the StreamReader buffer and are answered in
+    order; draining only waits when the transport buffer is over its limit.
+    """
+    served = 0
+    try:
+        while True:
+            try:
+                request = await asyncio.wait_for(
+                    read_request(reader), KEEPALIVE_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                return
+            if request is None:
+                return
+            if isinstance(request, int):
+                writer.write(encode_error(request))
+                await writer.drain()
+                return
+            method, target, version, headers = request
+            if method != "GET":
+                message = f"Unsupported method ({method!r})"
+                writer.write(encode_error(501, message))
+                await writer.drain()
+                return
+
+            started = time.perf_counter()
+            served += 1
+            keep_alive = (
+                wants_keep_alive(version, headers.get("connection"))
+                and served < MAX_KEEPALIVE_REQUESTS
+                and await discard_body(reader, headers)
+            )
+            if not keep_alive:
+                connection = CLOSE
+            elif version != "HTTP/1.1":
+                connection = KEEP_ALIVE
+            else:
+                connection = b""
+
+            route, entry = dispatch(method, target)
+            if isinstance(entry, FileResponse):
+                status, size = await send_file(writer, entry, headers,
+                                               connection)
+            else:
+                data = entry.encode(
+                    headers.get("if-none-match"), connection,
+                    headers.get("accept-encoding"),
+                )
+                writer.write(data)
+                await writer.drain()
+                status, size = int(data[9:12]), len(data)
+            record_request(route, status, size, started)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_async(host: str, port: int):
+    server = await asyncio.start_server(
+        handle_connection, host, port, limit=MAX_REQUEST_LINE,
+        backlog=ACCEPT_BACKLOG,
+    )
+    async with server:
+        await server.serve_forever()
+
+
+# --- worker pool mode --------------------------------------------------------
+# A fixed number of threads serve connections taken from a bounded queue.
+# When the queue is full the connection is answered 503 with Retry-After and
+# closed at once, so a spike costs rejected requests instead of a thread per
+# connection and collapsing latency for everyone.
+POOL_THREADS = 32
+POOL_QUEUE = 128
+RETRY_AFTER = 1
+
+
+class PooledHTTPServer(HTTPServer):
+    request_queue_size = ACCEPT_BACKLOG
+
+    def __init__(self, server_address, handler_class,
+                 threads: int = POOL_THREADS, queue_size: int = POOL_QUEUE):
+        super().__init__(server_address, handler_class)
+        self.pending = queue.Queue(queue_size)
+        self.accepted = 0
+        self.rejected = 0
+        self.busy = 0
+        self.busy_lock = threading.Lock()
+        self.rejection = CachedResponse(
+            *text_body(503, "Service Unavailable"),
+            headers={"Retry-After": RETRY_AFTER},
+        )
+        self.threads = [
+            threading.Thread(target=self.work, name=f"pool-{index}",
+                             daemon=True)
+            for index in range(threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+        METRICS.register("http_pool_queue_depth", "gauge",
+                         "Connections waiting for a pool thread.",
+                         self.pending.qsize)
+        METRICS.register("http_pool_busy_threads", "gauge",
+                         "Pool threads serving a connection.",
+                         lambda: self.busy)
+        METRICS.register("http_pool_accepted_total", "counter",
+                         "Connections queued for a pool thread.",
+                         lambda: self.accepted)
+        METRICS.register("http_pool_rejected_total", "counter",
+                         "Connections refused with 503, queue full.",
+                         lambda: self.rejected)
+
+    @property
+    def saturated(self) -> bool:
+        return not self.pending.empty()
+
+    def process_request(self, request, client_address):
+        try:
+            self.pending.put_nowait((request, client_address))
+        except queue.Full:
+            self.rejected += 1
+            self.reject(request)
+            return
+        self.accepted += 1
+
+    def reject(self, request):
+        try:
+            request.setblocking(False)
+            request.send(self.rejection.encode(extra=CLOSE))
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def work(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            with self.busy_lock:
+                self.busy += 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                with self.busy_lock:
+                    self.busy -= 1
+                self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self.threads:
+            self.pending.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+# --- prefork mode ------------------------------------------------------------
+# N worker processes each bind their own listening socket to the same port
+# with SO_REUSEPORT, so the kernel spreads connections across them and every
+# worker has its own GIL. The supervisor only forks, reaps and restarts.
+WORKER_BIND_FAILED = 3
+RESTART_DELAY = 1.0
+
+
+class ReusePortHTTPServer(ThreadedHTTPServer):
+    # Join request threads on close so in-flight responses finish
+    daemon_threads = False
+    block_on_close = True
+
+    def server_bind(self):
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+
+def serve_worker(host: str, port: int):
+    """Worker body: serve until SIGTERM/SIGINT, then drain and exit."""
+    try:
+        server = ReusePortHTTPServer((host, port), SimpleAPIHandler)
+    except OSError:
+        os._exit(WORKER_BIND_FAILED)
+
+    def stop(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so not from here
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def spawn_worker(host: str, port: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 1
+    try:
+        serve_worker(host, port)
+        code = 0
+    finally:
+        os._exit(code)
+
+
+def run_prefork(host: str, port: int, workers: int = None):
+    if not hasattr(socket, "SO_REUSEPORT") or not hasattr(os, "fork"):
+        raise RuntimeError("prefork mode needs fork() and SO_REUSEPORT")
+    # Workers would happily join another server's SO_REUSEPORT group, so
+    # claim the port exclusively once first and fail like the other modes.
+    with socket.create_server((host, port)):
+        pass
+    workers = workers or os.cpu_count() or 1
+    children = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        children[spawn_worker(host, port)] = time.monotonic()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        if os.waitstatus_to_exitcode(status) == WORKER_BIND_FAILED:
+            print(f"Worker could not bind {host}:{port}, shutting down")
+            stop(None, None)
+            continue
+        # Back off when workers die right after starting, not to fork-loop
+        if time.monotonic() - started < RESTART_DELAY:
+            time.sleep(RESTART_DELAY)
+        if not stopping:
+            children[spawn_worker(host, port)] = time.monotonic()
+
+
+# --- entry point -------------------------------------------------------------
+def run(mode: str = "threaded", host: str = HOST, port: int = PORT,
+        workers: int = None, threads: int = POOL_THREADS,
+        queue_size: int = POOL_QUEUE):
+    if mode not in MODES:
+        raise ValueError(f"unknown mode {mode!r}, expected one of {MODES}")
+    print(f"Serving on http://{host}:{port} ({mode})", flush=True)
+
+    if mode == "prefork":
+        return run_prefork(host, port, workers)
+
+    if mode == "async":
+        try:
+            asyncio.run(serve_async(host, port))
+        except KeyboardInterrupt:
+            pass
+        return
 
-def run():
-    server = ThreadingHTTPServer((HOST, PORT), SimpleAPIHandler)
-    print(f"Serving on http://{HOST}:{PORT}")
+    if mode == "pool":
+        server = PooledHTTPServer((host, port), SimpleAPIHandler, threads,
+                                  queue_size)
+    else:
+        server = ThreadedHTTPServer((host, port), SimpleAPIHandler)
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -69,4 +884,19 @@ def run():
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Simple http.server API")
+    parser.add_argument("--mode", choices=MODES, default="threaded")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int,
+                        help="prefork worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=POOL_THREADS,
+                        help="pool mode: connection-serving threads")
+    parser.add_argument("--queue", type=int, default=POOL_QUEUE,
+                        help="pool mode: queued connections before 503")
+    parser.add_argument("--static-root", default=STATIC_ROOT,
+                        help="directory served under /files/")
+    args = parser.parse_args()
+    STATIC_ROOT = args.static_root
+    run(args.mode, args.host, args.port, args.workers, args.threads,
+        args.queue)
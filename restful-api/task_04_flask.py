@@ -6,17 +6,73 @@ Endpoints:
   GET  /                 -> "Welcome to the Flask API!"
   GET  /status           -> "OK"
   GET  /data             -> JSON list of usernames (e.g., ["jane", "john"])
+  GET  /data?limit=N[&cursor=C]
+                         -> {"users": [...], "next_cursor": C or null}
+  GET  /data?format=ndjson[&cursor=C]
+                         -> streamed, one JSON username per line
+  GET  /users?city=C&min_age=A&max_age=B[&limit=N][&cursor=C]
+                         -> {"users": [user, ...], "next_cursor": C or null}
   GET  /users/<username> -> Full user object or {"error": "User not found"}
+  GET  /cache/stats      -> response cache hit/miss/eviction counters
   POST /add_user         -> Add user from JSON; 201 with confirmation payload
+  POST /add_users        -> Add users from an NDJSON body (one per line);
+                            {"added", "failed", "errors": [{"line", "error"}]}
 """
 
-from flask import Flask, jsonify, request
+import atexit
+import json
+import os
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+from response_cache import ResponseCache
+from shared_users import SharedMemoryBackend
+from user_log import LogBackend
+from user_store import (
+    InvalidCursor, UserStore, decode_cursor, encode_cursor, ingest_ndjson,
+    is_age, make_user,
+)
 
 app = Flask(__name__)
 
 # In-memory user store (keep EMPTY for the checker)
 # Structure: {"username": {"username": "...", "name": "...", "age": 0, "city": "..."}}
-users = {}
+# UserStore is used like that dict but keeps usernames sorted for paging.
+# Set USERS_DB_PATH to a directory to keep users across restarts, or
+# USERS_SHM_PATH to a file (e.g. under /dev/shm) shared by every worker
+# process, so users added through one worker are seen by all of them.
+USERS_DB_PATH = os.environ.get("USERS_DB_PATH")
+USERS_SHM_PATH = os.environ.get("USERS_SHM_PATH")
+if USERS_SHM_PATH:
+    users = UserStore(SharedMemoryBackend(USERS_SHM_PATH))
+else:
+    users = UserStore(LogBackend(USERS_DB_PATH) if USERS_DB_PATH else None)
+atexit.register(users.close)
+
+# Encoded bodies of GET /users/<username> and the full GET /data listing,
+# dropped by every write that touches them (see invalidate_responses)
+USER_CACHE_BYTES = int(os.environ.get("USER_CACHE_BYTES", 32 * 1024 * 1024))
+response_cache = ResponseCache(USER_CACHE_BYTES)
+DATA_KEY = ("data",)
+
+
+def invalidate_responses(usernames):
+    response_cache.invalidate(DATA_KEY,
+                              *(("user", name) for name in usernames))
+
+
+users.on_write = invalidate_responses
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH = 1000
+
+
+@app.before_request
+def catch_up():
+    # Writes from other worker processes (no-op unless USERS_SHM_PATH)
+    users.refresh()
 
 
 @app.route("/", methods=["GET"])
@@ -29,19 +85,147 @@ def status():
     return "OK"
 
 
+def limit_arg():
+    """Page size from ?limit, or None when it is out of range."""
+    try:
+        limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= MAX_PAGE_SIZE else None
+
+
 @app.route("/data", methods=["GET"])
 def data():
-    """Return a JSON list of all usernames stored in the API."""
-    return jsonify(list(users.keys()))
+    """Return a JSON list of all usernames stored in the API.
+
+    With ?limit and/or ?cursor the list is paginated; with ?format=ndjson
+    (or Accept: application/x-ndjson) it is streamed line by line. Without
+    either the full list is returned as before.
+    """
+    args = request.args
+    try:
+        after = decode_cursor(args["cursor"]) if "cursor" in args else None
+    except InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    ndjson = args.get("format") == "ndjson" or (
+        request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if ndjson:
+        return Response(stream_with_context(stream_usernames(after)),
+                        mimetype="application/x-ndjson")
+
+    if "limit" not in args and after is None:
+        entry = response_cache.get(DATA_KEY)
+        if entry is None:
+            token = response_cache.token(DATA_KEY)
+            entry = response_cache.put(DATA_KEY,
+                                       jsonify(users.keys()).get_data(),
+                                       token)
+        return cached_response(entry)
+
+    limit = limit_arg()
+    if limit is None:
+        return jsonify({"error": f"limit must be 1-{MAX_PAGE_SIZE}"}), 400
+    # Fetch one extra name to learn whether another page exists
+    names = users.page(after, limit + 1)
+    next_cursor = None
+    if len(names) > limit:
+        next_cursor = encode_cursor(names[limit - 1])
+    return jsonify({"users": names[:limit], "next_cursor": next_cursor})
+
+
+def stream_usernames(after):
+    """Yield NDJSON lines a batch at a time; memory stays O(batch)."""
+    batch = []
+    for name in users.iter_after(after, STREAM_BATCH):
+        batch.append(json.dumps(name))
+        if len(batch) == STREAM_BATCH:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+def age_arg(name):
+    """Parse an optional numeric query argument; raise ValueError if bad."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    number = float(value)
+    if number != number or number in (float("inf"), float("-inf")):
+        raise ValueError(name)
+    return int(number) if number.is_integer() else number
+
+
+@app.route("/users", methods=["GET"])
+def find_users():
+    """Return users matching every given filter, a page at a time.
+
+    Filters use the city and age indexes, so the cost follows the size of
+    the result rather than the number of users. Pages are ordered by
+    username, or by age then username when an age bound is given.
+    """
+    try:
+        min_age = age_arg("min_age")
+        max_age = age_arg("max_age")
+    except ValueError:
+        return jsonify({"error": "min_age and max_age must be numbers"}), 400
+    by_age = min_age is not None or max_age is not None
+
+    after = None
+    if "cursor" in request.args:
+        try:
+            after = json.loads(decode_cursor(request.args["cursor"]))
+        except (InvalidCursor, ValueError):
+            after = None
+        # Age-ordered cursors are [age, username], others a username
+        if by_age:
+            valid = (isinstance(after, list) and len(after) == 2
+                     and is_age(after[0]) and isinstance(after[1], str))
+        else:
+            valid = isinstance(after, str)
+        if not valid:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+    limit = limit_arg()
+    if limit is None:
+        return jsonify({"error": f"limit must be 1-{MAX_PAGE_SIZE}"}), 400
+
+    names, following = users.query(request.args.get("city"), min_age,
+                                   max_age, after, limit)
+    next_cursor = None
+    if following is not None:
+        next_cursor = encode_cursor(json.dumps(following))
+    return jsonify({"users": [users[name] for name in names],
+                    "next_cursor": next_cursor})
 
 
 @app.route("/users/<username>", methods=["GET"])
 def get_user(username):
     """Return the full object for a username, or error if not found."""
-    user = users.get(username)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    return jsonify(user)
+    key = ("user", username)
+    entry = response_cache.get(key)
+    if entry is None:
+        # Token first: a write landing after it keeps our body out
+        token = response_cache.token(key)
+        user = users.get(username)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+        entry = response_cache.put(key, jsonify(user).get_data(), token)
+    return cached_response(entry)
+
+
+def cached_response(entry):
+    """Serve pre-encoded JSON with its ETag; 304 when the client has it."""
+    response = Response(entry.body, mimetype="application/json")
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(response_cache.stats())
 
 
 @app.route("/add_user", methods=["POST"])
@@ -54,22 +238,35 @@ def add_user():
     """
     payload = request.get_json(silent=True) or {}
 
-    username = payload.get("username")
-    if not username:
-        return jsonify({"error": "Username is required"}), 400
-
     # Build the stored object (ensure 'username' is included in the record)
-    user_obj = {
-        "username": username,
-        "name": payload.get("name"),
-        "age": payload.get("age"),
-        "city": payload.get("city"),
-    }
-    users[username] = user_obj
+    user_obj, error = make_user(payload)
+    if error:
+        return jsonify({"error": error}), 400
+    users[user_obj["username"]] = user_obj
 
     return jsonify({"message": "User added", "user": user_obj}), 201
 
 
+@app.route("/add_users", methods=["POST"])
+def add_users():
+    """
+    Accepts an NDJSON body, one add_user payload per line:
+      {"username":"john","name":"John","age":30,"city":"New York"}
+      {"username":"jane","name":"Jane","age":28,"city":"Los Angeles"}
+    The body is read and inserted incrementally, never buffered whole.
+    Valid lines are added even when others fail; returns 201 if any user
+    was added, otherwise 400 (errors) or 200 (empty body).
+    """
+    summary = ingest_ndjson(request.stream, users)
+    if summary["added"]:
+        status = 201
+    elif summary["failed"]:
+        status = 400
+    else:
+        status = 200
+    return jsonify(summary), status
+
+
 if __name__ == "__main__":
     # Run development server (no debug by default, as per instructions)
     app.run()
@@ -7,12 +7,17 @@ Endpoints:
   POST /login            -> Returns JWT on valid credentials
   GET  /jwt-protected    -> JWT protected ("JWT Auth: Access Granted")
   GET  /admin-only       -> JWT + role check ("Admin Access: Granted"), 403 if not admin
+  POST /logout           -> JWT protected; revokes the token it was called with
+  GET  /auth/stats       -> admin only; credential, hash pool and JWT counters
 
 Auth rules:
   - All AUTHENTICATION errors (missing/invalid/expired/revoked JWT) -> 401
   - AUTHORIZATION failure (non-admin to /admin-only) -> 403 {"error": "Admin access required"}
+  - Password hashing backlog full -> 503 {"error": "Server busy"} + Retry-After
 """
 
+import os
+
 from flask import Flask, jsonify, request
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -21,41 +26,98 @@ from flask_httpauth import HTTPBasicAuth
 
 # JWT Auth
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required,
-    get_jwt_identity, get_jwt
+    create_access_token, jwt_required, get_jwt_identity, get_jwt
 )
 
+from credential_cache import CredentialCache
+from hash_pool import HashPool, PoolBusy
+from jwt_cache import CachingJWTManager
+from revocation import RevocationIndex
+from user_credentials import LazyUsers
+
 app = Flask(__name__)
 
 # --- SECURITY CONFIG ---------------------------------------------------------
 # Use a strong secret key in real deployments (env var, secrets manager, etc.)
 app.config["JWT_SECRET_KEY"] = "change-this-in-production"  # demo only
-jwt = JWTManager(app)
+# Verified claims are cached per token until its exp (see jwt_cache)
+jwt = CachingJWTManager(
+    app, max_entries=int(os.environ.get("JWT_CACHE_SIZE", 4096)))
 auth = HTTPBasicAuth()
 
+# Revoked token ids, each kept only until its token would expire anyway
+revoked_tokens = RevocationIndex(
+    bucket_seconds=int(os.environ.get("REVOCATION_BUCKET_SECONDS", 600)))
+
+
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    return revoked_tokens.is_revoked(jwt_payload["jti"],
+                                     jwt_payload.get("exp"))
+
+
 # In-memory users (hashed passwords)
-# Password for both demo users is: "password"
-users = {
-    "user1": {
-        "username": "user1",
-        "password": generate_password_hash("password"),
-        "role": "user",
-    },
-    "admin1": {
-        "username": "admin1",
-        "password": generate_password_hash("password"),
-        "role": "admin",
-    },
-}
+def demo_users():
+    # Password for both demo users is: "password"
+    return {
+        "user1": {
+            "username": "user1",
+            "password": generate_password_hash("password"),
+            "role": "user",
+        },
+        "admin1": {
+            "username": "admin1",
+            "password": generate_password_hash("password"),
+            "role": "admin",
+        },
+    }
+
+
+# Set AUTH_USERS_FILE to a file of precomputed hashes (written by
+# user_credentials.py) for real user tables. Either way nothing is read or
+# hashed at import: the users load on the first lookup.
+users = LazyUsers(os.environ.get("AUTH_USERS_FILE"), default=demo_users)
+
+
+# Successful verifications, so repeated Basic Auth requests skip the hash
+credential_cache = CredentialCache(
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", 300)),
+    max_entries=int(os.environ.get("AUTH_CACHE_SIZE", 10000)),
+)
 
+# Password hashing runs here, off the request threads, with a bounded
+# backlog; token-only requests never wait behind a burst of logins
+hash_pool = HashPool(
+    workers=int(os.environ.get("HASH_WORKERS", 0)) or None,
+    max_pending=int(os.environ.get("HASH_MAX_PENDING", 64)),
+)
 
-# --- BASIC AUTH --------------------------------------------------------------
-@auth.verify_password
-def verify_password(username, password):
+
+def check_credentials(username, password):
+    """Return the user if the password matches, else None."""
     user = users.get(username)
     if not user:
         return None
-    if check_password_hash(user["password"], password):
+    stored = user["password"]
+    if credential_cache.check(username, password, stored):
+        return user
+    if hash_pool.run(check_password_hash, stored, password):
+        credential_cache.add(username, password, stored)
+        return user
+    return None
+
+
+def set_password(username, password):
+    """Change a user's password and drop their cached verification."""
+    users[username]["password"] = hash_pool.run(generate_password_hash,
+                                                password)
+    credential_cache.invalidate(username)
+
+
+# --- BASIC AUTH --------------------------------------------------------------
+@auth.verify_password
+def verify_password(username, password):
+    if check_credentials(username, password):
         return username  # returning a truthy value means success
     return None
 
@@ -81,8 +143,8 @@ def login():
     if not username or not password:
         return jsonify({"error": "Missing credentials"}), 401
 
-    user = users.get(username)
-    if not user or not check_password_hash(user["password"], password):
+    user = check_credentials(username, password)
+    if not user:
         return jsonify({"error": "Invalid credentials"}), 401
 
     # Embed role inside JWT as an additional claim
@@ -99,6 +161,14 @@ def jwt_protected():
     return "JWT Auth: Access Granted", 200
 
 
+@app.route("/logout", methods=["POST"])
+@jwt_required()
+def logout():
+    claims = get_jwt()
+    revoked_tokens.revoke(claims["jti"], claims.get("exp"))
+    return jsonify({"msg": "Token revoked"}), 200
+
+
 def role_required(required_role):
     """
     Decorator to enforce role-based authorization using JWT claims.
@@ -125,6 +195,17 @@ def admin_only():
     return "Admin Access: Granted", 200
 
 
+@app.route("/auth/stats", methods=["GET"])
+@role_required("admin")
+def auth_stats():
+    return jsonify({
+        "credential_cache": credential_cache.stats(),
+        "hash_pool": hash_pool.stats(),
+        "jwt_cache": jwt.claims_cache.stats(),
+        "revoked_tokens": revoked_tokens.stats(),
+    }), 200
+
+
 # --- JWT ERROR HANDLERS (ALL -> 401) ----------------------------------------
 @jwt.unauthorized_loader
 def handle_unauthorized_error(err):
@@ -149,6 +230,13 @@ def handle_needs_fresh_token_error(jwt_header, jwt_payload):
     return jsonify({"error": "Fresh token required"}), 401
 
 
+# --- OVERLOAD ----------------------------------------------------------------
+@app.errorhandler(PoolBusy)
+def handle_pool_busy(err):
+    # Shed the request rather than queue it behind the hashing backlog
+    return jsonify({"error": "Server busy"}), 503, {"Retry-After": "1"}
+
+
 # --- MAIN --------------------------------------------------------------------
 if __name__ == "__main__":
     # No debug mode by default to match typical graders
@@ -0,0 +1,142 @@
+#!/usr/bin/python3
+"""Unittest for the shared-memory UserStore backend"""
+import os
+import tempfile
+import threading
+import unittest
+shared_users = __import__('shared_users')
+user_store = __import__('user_store')
+
+
+def user(name, age=30, city="Paris"):
+    return {"username": name, "name": name.title(), "age": age,
+            "city": city}
+
+
+class TestSharedMemoryBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "users.shm")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.tmp.cleanup()
+
+    def open_store(self, **kwargs):
+        """A UserStore on its own open file, like another worker's."""
+        backend = shared_users.SharedMemoryBackend(self.path, **kwargs)
+        store = user_store.UserStore(backend)
+        self.stores.append(store)
+        return store
+
+    def test_encode_round_trip(self):
+        for record in (user("ana"), user("bo", age=None, city=None),
+                       {"username": "x", "age": 2.5, "extra": [1]},
+                       {"username": "y", "name": "é", "age": -2 ** 63,
+                        "city": ""}):
+            decoded = shared_users.decode_user(
+                shared_users.encode_user(record))
+            expected = {"name": None, "age": None, "city": None}
+            expected.update(record)
+            self.assertIn(decoded, (record, expected))
+
+    def test_other_process_sees_writes(self):
+        first, second = self.open_store(), self.open_store()
+        first["ana"] = user("ana")
+        first.add_many([user("bo"), user("cy")])
+        self.assertNotIn("ana", second)
+        second.refresh()
+        self.assertEqual(second["cy"], user("cy"))
+        self.assertEqual(list(second.keys()), ["ana", "bo", "cy"])
+
+    def test_concurrent_threads_lose_no_writes(self):
+        store = self.open_store(initial_size=4096)
+        threads, per_thread = 8, 500
+
+        def write(number):
+            for i in range(per_thread):
+                name = "t{}-{}".format(number, i)
+                store[name] = user(name, age=i)
+
+        workers = [threading.Thread(target=write, args=(n,))
+                   for n in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(len(store), threads * per_thread)
+        fresh = self.open_store()
+        self.assertEqual(len(fresh), threads * per_thread)
+        self.assertEqual({name: fresh[name] for name in fresh.keys()},
+                         {name: store[name] for name in store.keys()})
+
+    def test_forked_workers_lose_no_writes(self):
+        # Opened once, then forked, like a server preloading the app
+        store = self.open_store(initial_size=4096)
+        workers, per_worker = 4, 2000
+        pids = []
+        for number in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    store.add_many([user("p{}-{}".format(number, i), age=i)
+                                    for i in range(per_worker)])
+                    for i in range(per_worker):
+                        name = "q{}-{}".format(number, i)
+                        store[name] = user(name)
+                    code = 0
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        for pid in pids:
+            self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+        fresh = self.open_store()
+        self.assertEqual(len(fresh), 2 * workers * per_worker)
+        store.refresh()
+        self.assertEqual(len(store), 2 * workers * per_worker)
+
+    def test_own_writes_not_applied_twice(self):
+        other, store = self.open_store(), self.open_store()
+        written = []
+        store.on_write = written.extend
+        store["ana"] = user("ana")
+        store.refresh()
+        self.assertEqual(written, ["ana"])
+        # Interleaved with another process's write: only that is new
+        other["bo"] = user("bo")
+        store["cy"] = user("cy")
+        store.refresh()
+        self.assertEqual(written, ["ana", "cy", "bo"])
+        store.refresh()
+        self.assertEqual(written, ["ana", "cy", "bo"])
+
+    def test_last_write_wins_everywhere(self):
+        first, second = self.open_store(), self.open_store()
+        first["ana"] = user("ana", age=1)
+        second["ana"] = user("ana", age=2)
+        first.refresh()
+        second.refresh()
+        self.assertEqual(first["ana"]["age"], 2)
+        self.assertEqual(second["ana"]["age"], 2)
+
+    def test_file_grows(self):
+        store = self.open_store(initial_size=4096)
+        store.add_many([user("u{}".format(i)) for i in range(2000)])
+        fresh = self.open_store()
+        self.assertEqual(len(fresh), 2000)
+        self.assertGreater(os.path.getsize(self.path), 4096)
+
+    def test_rejects_foreign_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a users file" * 4)
+        with self.assertRaises(ValueError):
+            shared_users.SharedMemoryBackend(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+"""Unittest for task_02_requests against a local stand-in for the API"""
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+from requests.adapters import HTTPAdapter
+task_02 = __import__('task_02_requests')
+
+# Per-request delay of the stand-in, like a round trip to a remote API
+LATENCY = 0.02
+KINDS = ("posts", "comments", "users")
+
+
+def resource(kind, number):
+    return {"id": number, "title": f"{kind} {number}", "body": "text"}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves /posts and /<kind>/<id> for ids 1-100, with keep-alive"""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(LATENCY)
+        with self.server.lock:
+            self.server.connections.add(self.client_address)
+            self.server.requests += 1
+        parts = self.path.strip("/").split("/")
+        if parts == ["posts"]:
+            status, body = 200, [resource("posts", i) for i in (1, 2, 3)]
+        elif len(parts) == 2 and parts[0] in KINDS and parts[1].isdigit() \
+                and 1 <= int(parts[1]) <= 100:
+            status, body = 200, resource(parts[0], int(parts[1]))
+        else:
+            status, body = 404, {"error": "Not found"}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestPooledFetching(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever,
+                                      daemon=True)
+        cls.thread.start()
+        cls.base = "http://127.0.0.1:{}".format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        with self.server.lock:
+            self.server.connections = set()
+            self.server.requests = 0
+        # A fresh session per test, so connection counts start from zero
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=task_02.POOL_SIZE,
+                              pool_maxsize=task_02.POOL_SIZE)
+        self.session.mount("http://", adapter)
+
+    def tearDown(self):
+        self.session.close()
+
+    def urls(self, count, kind="posts"):
+        return ["{}/{}/{}".format(self.base, kind, i)
+                for i in range(1, count + 1)]
+
+    def test_session_is_shared(self):
+        self.assertIs(task_02.get_session(), task_02.get_session())
+
+    def test_fetch_json(self):
+        post = task_02.fetch_json(self.base + "/posts/7", self.session)
+        self.assertEqual(post, resource("posts", 7))
+
+    def test_fetch_json_http_error(self):
+        with self.assertRaises(requests.HTTPError):
+            task_02.fetch_json(self.base + "/posts/999", self.session)
+
+    def test_fetch_many_keeps_order(self):
+        results = task_02.fetch_many(self.urls(30), session=self.session)
+        self.assertEqual(results, [resource("posts", i)
+                                   for i in range(1, 31)])
+
+    def test_fetch_many_reports_errors_per_url(self):
+        urls = [self.base + "/posts/1", self.base + "/posts/999",
+                self.base + "/posts/2"]
+        results = task_02.fetch_many(urls, session=self.session)
+        self.assertEqual(results[0], resource("posts", 1))
+        self.assertIsInstance(results[1], requests.HTTPError)
+        self.assertEqual(results[2], resource("posts", 2))
+
+    def test_fetch_many_empty(self):
+        self.assertEqual(task_02.fetch_many([], session=self.session), [])
+
+    def test_fetch_resources(self):
+        for kind in KINDS:
+            results = task_02.fetch_resources(kind, [3, 1],
+                                              base_url=self.base,
+                                              session=self.session)
+            self.assertEqual(results, [resource(kind, 3),
+                                       resource(kind, 1)])
+
+    def test_connections_are_reused(self):
+        task_02.fetch_many(self.urls(60), max_workers=5,
+                           session=self.session)
+        self.assertEqual(self.server.requests, 60)
+        self.assertLessEqual(len(self.server.connections), 5)
+
+    def test_concurrent_faster_than_serial(self):
+        urls = self.urls(50)
+        start = time.perf_counter()
+        serial = [requests.get(url).json() for url in urls]
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = task_02.fetch_many(urls, max_workers=10,
+                                        session=self.session)
+        concurrent_time = time.perf_counter() - start
+
+        self.assertEqual(serial, concurrent)
+        # 10 requests in flight against a fixed per-request latency
+        self.assertGreater(serial_time / concurrent_time, 3)
+
+    def test_fetch_and_print_posts(self):
+        out = io.StringIO()
+        with mock.patch.object(task_02, "BASE_URL", self.base), \
+                redirect_stdout(out):
+            task_02.fetch_and_print_posts()
+        self.assertEqual(out.getvalue().splitlines(),
+                         ["Status Code: 200", "posts 1", "posts 2",
+                          "posts 3"])
+
+    def test_fetch_and_save_posts(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with mock.patch.object(task_02, "BASE_URL", self.base), \
+                        redirect_stdout(io.StringIO()):
+                    task_02.fetch_and_save_posts()
+                with open("posts.csv", newline="", encoding="utf-8") as f:
+                    rows = list(csv.DictReader(f))
+            finally:
+                os.chdir(cwd)
+        self.assertEqual(rows, [
+            {"id": str(i), "title": "posts {}".format(i), "body": "text"}
+            for i in (1, 2, 3)
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Lazily loaded user records with precomputed password hashes.
+
+task_05_basic_security used to call generate_password_hash() for every
+user at import time. Password hashes are slow on purpose, so worker boot
+(and every test import) grew with the user table. Instead:
+
+- hashes are computed once, offline, by this module's CLI and written as
+  NDJSON, one {"username", "password" (the hash), "role"} per line;
+- LazyUsers reads that file, or builds the default users, on the first
+  lookup rather than at import, so importing costs the same for two
+  users or two million.
+
+Generating a file (plaintext NDJSON users on stdin, or --demo N):
+  python3 user_credentials.py users.ndjson < plain.ndjson
+  python3 user_credentials.py users.ndjson --demo 100000 --workers 8
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+HASH_BATCH = 1000
+
+
+def read_users(path):
+    """{username: user} from an NDJSON file of precomputed hashes."""
+    users = {}
+    decode = json.JSONDecoder().decode
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            user = decode(line)
+            # A werkzeug hash is "method$salt$hash"; anything else is
+            # most likely a plaintext password that was never hashed
+            if user.get("password", "").count("$") != 2:
+                raise ValueError(f"{path}:{number}: password is not a hash")
+            users[user["username"]] = user
+    return users
+
+
+class LazyUsers:
+    """Mapping of username -> user, loaded on first access.
+
+    Reads ``path`` if given, else calls ``default()`` for the records.
+    """
+
+    def __init__(self, path=None, default=dict):
+        self.path = path
+        self.default = default
+        self._users = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        users = self._users
+        if users is None:
+            with self.lock:
+                if self._users is None:
+                    self._users = (read_users(self.path) if self.path
+                                   else self.default())
+                users = self._users
+        return users
+
+    @property
+    def loaded(self):
+        return self._users is not None
+
+    def get(self, username, default=None):
+        return self._load().get(username, default)
+
+    def __getitem__(self, username):
+        return self._load()[username]
+
+    def __setitem__(self, username, user):
+        self._load()[username] = user
+
+    def __contains__(self, username):
+        return username in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+# --- generator CLI -----------------------------------------------------------
+def hash_users(users, method=None, workers=None):
+    """Yield the users with "password" replaced by its hash, in order.
+
+    hashlib releases the GIL while hashing, so threads use every core.
+    Users are submitted HASH_BATCH at a time to bound memory.
+    """
+    options = {"method": method} if method else {}
+
+    def hashed(user):
+        return dict(user, password=generate_password_hash(user["password"],
+                                                          **options))
+
+    users = iter(users)
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        while True:
+            batch = list(itertools.islice(users, HASH_BATCH))
+            if not batch:
+                return
+            yield from pool.map(hashed, batch)
+
+
+def demo_users(count):
+    """user0 ... user<count-1> with password "password"; user0 is admin."""
+    for i in range(count):
+        yield {"username": f"user{i}", "password": "password",
+               "role": "admin" if i == 0 else "user"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Write a precomputed password hash file for task_05")
+    parser.add_argument("output", help="NDJSON file to write")
+    parser.add_argument("--demo", type=int, metavar="N",
+                        help="generate N demo users instead of reading "
+                             "plaintext NDJSON users from stdin")
+    parser.add_argument("--method",
+                        help="werkzeug hash method, e.g. pbkdf2:sha256")
+    parser.add_argument("--workers", type=int, help="hashing threads")
+    args = parser.parse_args(argv)
+
+    if args.demo is not None:
+        users = demo_users(args.demo)
+    else:
+        users = (json.loads(line) for line in sys.stdin if line.strip())
+    # Written next to the target and renamed: readers never see half a file
+    tmp = args.output + ".tmp"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for user in hash_users(users, args.method, args.workers):
+            f.write(json.dumps(user) + "\n")
+            count += 1
+    os.replace(tmp, args.output)
+    print(f"wrote {count} users to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Durable backend for UserStore: append-only log, group commit, snapshots.
+
+Layout of the data directory:
+  log-<gen>.ndjson       one JSON user per line, appended in commit order
+  snapshot-<gen>.ndjson  every user as of the start of log-<gen>, one JSON
+                         user per line in creation order, so a restart
+                         keeps the insertion order GET /data lists
+
+Writes: append() queues the encoded line and waits until it is on disk. A
+single flusher thread writes everything queued so far with one write() and
+one fsync(), then wakes all the writers it covered. While one fsync is in
+flight the next batch accumulates, so N concurrent writers share fsyncs
+instead of queueing behind N of them (group commit).
+
+Snapshots: after snapshot_every records the flusher starts a new log
+segment and a background thread folds the previous snapshot and the
+finished segments into a new snapshot, then deletes what it replaced.
+Recovery loads the newest snapshot and replays only the log tail, so
+restart time is bounded by the snapshot load rather than by history.
+
+A torn final line (crash mid-write) is truncated away on recovery; it was
+never acknowledged to a client. Both kinds of file are plain JSON, so
+files in the data directory are only ever parsed as data.
+"""
+
+import glob
+import itertools
+import json
+import os
+import threading
+
+SNAPSHOT_EVERY = 1000000
+SNAPSHOT_CHUNK = 100000         # users per write() of a snapshot
+REPLAY_BATCH = 10000            # lines per batch handed to load()
+
+
+def _gen(path):
+    return int(os.path.basename(path).split("-")[1].split(".")[0])
+
+
+class LogBackend:
+    """Append-only, group-committed user log in directory ``path``."""
+
+    shared = False
+
+    def __init__(self, path, snapshot_every=SNAPSHOT_EVERY, fsync=True):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.has_work = threading.Condition(self.lock)
+        self.flushed = threading.Condition(self.lock)
+        self.pending = []
+        self.appended = 0       # sequence number of the last queued line
+        self.durable = 0        # sequence number of the last fsynced line
+        self.error = None
+        self.closed = False
+
+        self.file = None
+        self.generation = 0
+        self.segment_records = 0
+        self.replayed = 0
+        self.flusher = None
+        self.compactor = None
+
+        # Group commit statistics
+        self.batches = 0
+        self.records = 0
+
+    # --- files -------------------------------------------------------------
+    def _log_path(self, gen):
+        return os.path.join(self.path, f"log-{gen:08d}.ndjson")
+
+    def _snapshot_path(self, gen):
+        return os.path.join(self.path, f"snapshot-{gen:08d}.ndjson")
+
+    def _generations(self, kind):
+        pattern = "log-*.ndjson" if kind == "log" else "snapshot-*.ndjson"
+        return sorted(_gen(p) for p in
+                      glob.glob(os.path.join(self.path, pattern)))
+
+    def _sync_dir(self):
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --- recovery ----------------------------------------------------------
+    def load(self):
+        """Yield {username: user} batches in commit order, then open the
+        log for writing. Applying them with dict.update() in order gives
+        the stored state.
+        """
+        snapshots = self._generations("snapshot")
+        base = snapshots[-1] if snapshots else None
+        if base is not None:
+            yield from self._read_snapshot(base)
+        logs = [g for g in self._generations("log")
+                if base is None or g >= base]
+        for gen in logs:
+            batch = {}
+            for user in self._read_log(gen, last=gen == logs[-1]):
+                batch[user["username"]] = user
+                if len(batch) >= REPLAY_BATCH:
+                    yield batch
+                    batch = {}
+            yield batch
+            self.segment_records = self.replayed
+        self.generation = logs[-1] if logs else (base or 0)
+        self._open_segment()
+
+    def _read_snapshot(self, gen):
+        """{username: user} batches of a snapshot.
+
+        Snapshots are written whole and renamed into place, so unlike the
+        log they are never torn: a batch of lines is decoded as one JSON
+        array, a single call into the C decoder.
+        """
+        decode = json.JSONDecoder().decode
+        with open(self._snapshot_path(gen), encoding="utf-8") as f:
+            while True:
+                lines = list(itertools.islice(f, REPLAY_BATCH))
+                if not lines:
+                    return
+                users = decode("[" + ",".join(lines) + "]")
+                yield {user["username"]: user for user in users}
+
+    def _read_log(self, gen, last):
+        path = self._log_path(gen)
+        good = 0
+        self.replayed = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    user = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                self.replayed += 1
+                yield user
+        if last and good != os.path.getsize(path):
+            with open(path, "r+b") as f:
+                f.truncate(good)
+
+    def _open_segment(self):
+        self.file = open(self._log_path(self.generation), "ab",
+                         buffering=0)
+        self.flusher = threading.Thread(target=self._flush_loop,
+                                        name="user-log-flusher", daemon=True)
+        self.flusher.start()
+
+    # --- writes ------------------------------------------------------------
+    def append(self, user):
+        """Queue ``user`` and return its commit number once durable."""
+        return self.append_many((user,))
+
+    def append_many(self, users):
+        """Queue several users and return once all of them are durable.
+
+        Returns the commit number of the first; the rest follow in order.
+        """
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        lines = [encode(user).encode() + b"\n" for user in users]
+        with self.lock:
+            if self.closed or self.file is None:
+                raise ValueError("log is not open")
+            self.pending += lines
+            self.appended += len(lines)
+            seq = self.appended
+            self.has_work.notify()
+            while self.durable < seq:
+                if self.error is not None:
+                    raise self.error
+                self.flushed.wait()
+        return seq - len(lines) + 1
+
+    def poll(self):
+        """The log has a single writer process: nothing to catch up on."""
+        return ()
+
+    def _flush_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending and not self.closed:
+                    self.has_work.wait()
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, []
+                upto = self.appended
+            try:
+                self.file.write(b"".join(batch))
+                if self.fsync:
+                    os.fsync(self.file.fileno())
+            except OSError as exc:
+                with self.lock:
+                    self.error = exc
+                    self.flushed.notify_all()
+                return
+            with self.lock:
+                self.durable = upto
+                self.batches += 1
+                self.records += len(batch)
+                self.flushed.notify_all()
+            self.segment_records += len(batch)
+            if self.segment_records >= self.snapshot_every:
+                self._rotate()
+
+    def _rotate(self):
+        """Start a new segment and snapshot everything before it."""
+        if self.compactor is not None and self.compactor.is_alive():
+            return              # previous snapshot still being written
+        self.file.close()
+        self.generation += 1
+        self.segment_records = 0
+        self.file = open(self._log_path(self.generation), "ab",
+                         buffering=0)
+        if self.fsync:
+            self._sync_dir()
+        self.compactor = threading.Thread(
+            target=self.compact, args=(self.generation,),
+            name="user-log-compactor", daemon=True,
+        )
+        self.compactor.start()
+
+    # --- compaction --------------------------------------------------------
+    def compact(self, upto):
+        """Write snapshot-<upto> from older snapshots and logs < upto."""
+        snapshots = [g for g in self._generations("snapshot") if g < upto]
+        base = snapshots[-1] if snapshots else None
+        state = {}
+        if base is not None:
+            for chunk in self._read_snapshot(base):
+                state.update(chunk)
+        for gen in self._generations("log"):
+            if (base is None or gen >= base) and gen < upto:
+                for user in self._read_log(gen, last=False):
+                    state[user["username"]] = user
+
+        # state is in creation order: a key keeps the position of its
+        # first insert when later records replace its value
+        path = self._snapshot_path(upto)
+        tmp = path + ".tmp"
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        users = list(state.values())
+        with open(tmp, "w", encoding="utf-8") as f:
+            for start in range(0, len(users), SNAPSHOT_CHUNK):
+                f.write("".join(encode(user) + "\n" for user in
+                                users[start:start + SNAPSHOT_CHUNK]))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        if self.fsync:
+            self._sync_dir()
+
+        # Everything below is now covered by the new snapshot
+        for gen in self._generations("snapshot"):
+            if gen < upto:
+                os.remove(self._snapshot_path(gen))
+        for gen in self._generations("log"):
+            if gen < upto:
+                os.remove(self._log_path(gen))
+
+    # --- lifecycle ---------------------------------------------------------
+    def stats(self):
+        with self.lock:
+            batches, records = self.batches, self.records
+        return {
+            "generation": self.generation,
+            "commits": batches,
+            "records": records,
+            "records_per_fsync": records / batches if batches else 0.0,
+        }
+
+    def close(self):
+        """Flush what is queued and stop the background threads."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.has_work.notify()
+        if self.flusher is not None:
+            self.flusher.join()
+        if self.compactor is not None:
+            self.compactor.join()
+        if self.file is not None:
+            self.file.close()
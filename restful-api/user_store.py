@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+"""
+User store for the Flask API.
+
+UserStore behaves like the plain {"username": user} dict it replaces, and
+also keeps the usernames in a SortedIndex. A page of usernames is then a
+binary search for the cursor plus a slice, so page N costs the same as
+page 1: O(log n + limit) instead of walking everything before it.
+
+SortedIndex is a list of sorted buckets of at most 2 * LOAD keys (the
+layout used by the sortedcontainers package). Inserting moves at most one
+bucket's worth of pointers, where a single flat list would move O(n) and
+make loading millions of keys quadratic.
+
+Secondary indexes answer filters without scanning every user: city maps
+to a SortedIndex of usernames (hash lookup, then ordered paging) and age
+is a SortedIndex of (age, username) pairs (range scans). query() drives
+from whichever index yields fewer candidates and checks the other filter
+per candidate, so its cost follows the result, not the user count.
+
+Concurrency: users are striped over SHARDS shards by username hash, each
+with its own lock, records and indexes, so writers to different shards do
+not contend. Multi-shard reads (pages, queries) lock one shard at a time
+and merge the sorted per-shard results with heapq.merge; the full /data
+listing locks every shard (in a fixed order) to copy a consistent
+snapshot.
+
+Persistence is pluggable: a backend provides load() ({username: user}
+batches, in commit order), append(user) and append_many(users), which
+return once the write is durable along with its commit number (or None),
+poll() (writes other processes made since the last poll, as (commit
+number, user) pairs) and close(). MemoryBackend keeps nothing;
+user_log.LogBackend is durable; shared_users.SharedMemoryBackend shares
+one table between worker processes, which catch up with refresh().
+
+Cursors are opaque to clients: the last username of a page, urlsafe
+base64 encoded. Paging by key (not by offset) also means users added
+while a client is paging never shift or repeat the names it has seen.
+"""
+
+import base64
+import binascii
+import gc
+import heapq
+import itertools
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+
+USER_FIELDS = ("name", "age", "city")
+
+# Lock stripes: a user lives in shard hash(username) % SHARDS
+SHARDS = 16
+
+# Bulk ingestion: users inserted per add_many() call, longest accepted
+# NDJSON line, and how many per-line errors are reported back in detail
+BULK_BATCH = 5000
+MAX_LINE = 65536
+MAX_REPORTED_ERRORS = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor we did not issue."""
+
+
+def encode_cursor(username: str) -> str:
+    return base64.urlsafe_b64encode(username.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        # validate=True: urlsafe_b64decode() would silently skip bytes
+        # outside the alphabet, turning "!!!" into the empty cursor
+        raw = base64.b64decode(cursor + "=" * (-len(cursor) % 4),
+                               altchars=b"-_", validate=True)
+        return raw.decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+class _Highest:
+    """Compares greater than any other value; (age, HIGHEST) is the upper
+    bound of every (age, username) key with that age."""
+
+    def __lt__(self, other):
+        return False
+
+    def __gt__(self, other):
+        return other is not self
+
+    def __le__(self, other):
+        return other is self
+
+    def __ge__(self, other):
+        return True
+
+
+HIGHEST = _Highest()
+INF = float("inf")
+
+
+def is_age(value):
+    """Ages are indexed only when they are finite real numbers.
+
+    NaN compares false against everything and would break the sort order
+    of the age index; the infinities are refused like in age_arg().
+    """
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and value == value and value not in (INF, -INF))
+
+
+class SortedIndex:
+    """Sorted collection of unique, comparable keys."""
+
+    LOAD = 1000
+
+    def __init__(self, keys=()):
+        self.lists = []         # sorted buckets
+        self.maxes = []         # maxes[i] == lists[i][-1]
+        self.size = 0
+        for key in sorted(set(keys)):
+            self._append(key)
+
+    @classmethod
+    def from_sorted(cls, keys):
+        """Build from a sorted list of unique keys in O(n)."""
+        index = cls()
+        index.lists = [keys[i:i + cls.LOAD]
+                       for i in range(0, len(keys), cls.LOAD)]
+        index.maxes = [bucket[-1] for bucket in index.lists]
+        index.size = len(keys)
+        return index
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for bucket in self.lists:
+            yield from bucket
+
+    def _append(self, key):
+        """Add a key larger than all present ones (bulk loading)."""
+        if not self.lists or len(self.lists[-1]) >= self.LOAD:
+            self.lists.append([])
+            self.maxes.append(key)
+        self.lists[-1].append(key)
+        self.maxes[-1] = key
+        self.size += 1
+
+    def add(self, key):
+        """Insert ``key``; a no-op if it is already present."""
+        lists, maxes = self.lists, self.maxes
+        if not maxes:
+            lists.append([key])
+            maxes.append(key)
+            self.size = 1
+            return
+        i = bisect_left(maxes, key)
+        if i == len(maxes):
+            i -= 1
+            lists[i].append(key)
+            maxes[i] = key
+        else:
+            bucket = lists[i]
+            j = bisect_left(bucket, key)
+            if bucket[j] == key:
+                return
+            bucket.insert(j, key)
+        self.size += 1
+        bucket = lists[i]
+        if len(bucket) > 2 * self.LOAD:
+            lists.insert(i + 1, bucket[self.LOAD:])
+            del bucket[self.LOAD:]
+            maxes.insert(i, bucket[-1])
+
+    def discard(self, key):
+        """Remove ``key`` if present."""
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return
+        bucket = self.lists[i]
+        j = bisect_left(bucket, key)
+        if bucket[j] != key:
+            return
+        del bucket[j]
+        self.size -= 1
+        if bucket:
+            self.maxes[i] = bucket[-1]
+        else:
+            del self.lists[i]
+            del self.maxes[i]
+
+    def clear(self):
+        self.lists = []
+        self.maxes = []
+        self.size = 0
+
+    def rank(self, key):
+        """Number of keys smaller than ``key``; O(buckets) not O(n)."""
+        i = bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            return self.size
+        return (sum(map(len, self.lists[:i]))
+                + bisect_left(self.lists[i], key))
+
+    def irange(self, start=None, inclusive=True):
+        """Yield keys from ``start`` onwards (all keys when None)."""
+        if start is None:
+            yield from self
+            return
+        find = bisect_left if inclusive else bisect_right
+        i = find(self.maxes, start)
+        if i == len(self.maxes):
+            return
+        lists = self.lists
+        yield from lists[i][find(lists[i], start):]
+        for bucket in lists[i + 1:]:
+            yield from bucket
+
+    def page(self, after=None, limit=100):
+        """Up to ``limit`` keys strictly greater than ``after``."""
+        result = []
+        if after is None:
+            i, j = 0, 0
+        else:
+            i = bisect_right(self.maxes, after)
+            if i == len(self.maxes):
+                return result
+            j = bisect_right(self.lists[i], after)
+        lists = self.lists
+        while i < len(lists) and len(result) < limit:
+            result += lists[i][j:j + limit - len(result)]
+            i, j = i + 1, 0
+        return result
+
+
+class MemoryBackend:
+    """Backend that persists nothing (the default)."""
+
+    shared = False
+
+    def load(self):
+        return ()
+
+    def append(self, user):
+        return None
+
+    def append_many(self, users):
+        return None
+
+    def poll(self):
+        return ()
+
+    def close(self):
+        pass
+
+
+class _Shard:
+    """One stripe of the store: its users, their indexes and its lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = {}
+        # username -> (creation number, commit number of the stored value);
+        # insertion order of this dict is creation order
+        self.meta = {}
+        self.order = SortedIndex()
+        self.by_city = {}               # city -> SortedIndex of usernames
+        self.by_age = SortedIndex()     # (age, username)
+
+    def rebuild(self):
+        """Recreate every index from records in one pass (bulk loads)."""
+        records = self.records
+        self.order = SortedIndex.from_sorted(sorted(records))
+        cities = {}
+        ages = []
+        for username, user in records.items():
+            city = user.get("city")
+            if isinstance(city, str):
+                cities.setdefault(city, []).append(username)
+            age = user.get("age")
+            if is_age(age):
+                ages.append((age, username))
+        self.by_city = {city: SortedIndex.from_sorted(sorted(names))
+                        for city, names in cities.items()}
+        ages.sort()
+        self.by_age = SortedIndex.from_sorted(ages)
+
+    def clear(self):
+        self.records.clear()
+        self.meta.clear()
+        self.order.clear()
+        self.by_city.clear()
+        self.by_age.clear()
+
+    def _index(self, user):
+        username = user["username"]
+        city = user.get("city")
+        if isinstance(city, str):
+            index = self.by_city.get(city)
+            if index is None:
+                index = self.by_city[city] = SortedIndex()
+            index.add(username)
+        age = user.get("age")
+        if is_age(age):
+            self.by_age.add((age, username))
+
+    def _unindex(self, user):
+        username = user["username"]
+        city = user.get("city")
+        if isinstance(city, str):
+            index = self.by_city[city]
+            index.discard(username)
+            if not index:
+                del self.by_city[city]
+        age = user.get("age")
+        if is_age(age):
+            self.by_age.discard((age, username))
+
+    def put(self, username, user, version, created):
+        """Store ``user`` unless a later commit already replaced it.
+
+        Called with the lock held. ``created`` is the creation number to
+        record if the username is new (or older than the one recorded).
+        """
+        meta = self.meta.get(username)
+        if meta is None:
+            self.meta[username] = (created, version)
+            self.order.add(username)
+        elif version < meta[1]:
+            if created < meta[0]:
+                self.meta[username] = (created, meta[1])
+            return
+        else:
+            self.meta[username] = (min(created, meta[0]), version)
+            self._unindex(self.records[username])
+        self.records[username] = user
+        self._index(user)
+
+    # --- filtered access (lock held) ---------------------------------------
+    def query(self, city, min_age, max_age, after, limit):
+        """Up to ``limit`` sort keys of matching users after ``after``."""
+        if city is not None and city not in self.by_city:
+            return []
+        if min_age is None and max_age is None:
+            index = self.order if city is None else self.by_city[city]
+            return index.page(after, limit)
+        lo = (min_age,) if min_age is not None else None
+        hi = (max_age, HIGHEST) if max_age is not None else None
+        if city is None or self._age_span(lo, hi) <= len(self.by_city[city]):
+            return self._scan_age(lo, max_age, city, after, limit)
+        return self._scan_city(city, min_age, max_age, after, limit)
+
+    def _age_span(self, lo, hi):
+        """How many (age, username) keys fall between lo and hi."""
+        start = self.by_age.rank(lo) if lo is not None else 0
+        end = self.by_age.rank(hi) if hi is not None else len(self.by_age)
+        return end - start
+
+    def _scan_age(self, lo, max_age, city, after, limit):
+        """Walk the age index from lo, checking city per candidate."""
+        if after is not None and (lo is None or after >= lo):
+            keys = self.by_age.irange(after, inclusive=False)
+        else:
+            keys = self.by_age.irange(lo)
+        records = self.records
+        found = []
+        for key in keys:
+            if max_age is not None and key[0] > max_age:
+                break
+            if city is None or records[key[1]].get("city") == city:
+                found.append(key)
+                if len(found) == limit:
+                    break
+        return found
+
+    def _scan_city(self, city, min_age, max_age, after, limit):
+        """Filter one city's users by age; used when the city is the
+        smaller candidate set. Costs O(users in that city)."""
+        records = self.records
+        low = float("-inf") if min_age is None else min_age
+        high = float("inf") if max_age is None else max_age
+        found = []
+        for name in self.by_city[city]:
+            age = records[name].get("age")
+            if is_age(age) and low <= age <= high:
+                found.append((age, name))
+        if after is not None:
+            found = [key for key in found if key > after]
+        found.sort()
+        return found[:limit]
+
+
+class UserStore:
+    """Mapping of username -> user dict, striped over lock-guarded shards.
+
+    Plain iteration keeps dict (insertion) order; page(), iter_after() and
+    query() walk usernames in sorted order.
+    """
+
+    def __init__(self, backend=None, shards=SHARDS):
+        self.backend = backend or MemoryBackend()
+        self.shards = [_Shard() for _ in range(shards)]
+        self.created = itertools.count()
+        # A shared backend's commit numbers are one sequence across all
+        # processes; they double as creation numbers there, so every
+        # process lists users in the same order
+        self.shared = self.backend.shared
+        # Called with the written usernames once they are visible, e.g.
+        # to invalidate cached responses
+        self.on_write = None
+        self.load(self.backend.load())
+
+    def _shard(self, username):
+        return self.shards[hash(username) % len(self.shards)]
+
+    def load(self, batches):
+        """Bulk-insert {username: user} batches without writing them to
+        the backend.
+
+        Users are numbered in the order they arrive, which for a backend
+        is creation order. Indexes are rebuilt once at the end, one sort
+        per index rather than n inserts. The cyclic GC is paused meanwhile:
+        millions of new dicts and index tuples would otherwise trigger
+        repeated full collections that find nothing.
+        """
+        shards, count, created = self.shards, len(self.shards), self.created
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for batch in batches:
+                for username, user in batch.items():
+                    shard = shards[hash(username) % count]
+                    if username not in shard.meta:
+                        shard.meta[username] = (next(created), 0)
+                    shard.records[username] = user
+            for shard in shards:
+                with shard.lock:
+                    shard.rebuild()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def close(self):
+        self.backend.close()
+
+    @contextmanager
+    def locked(self):
+        """Hold every shard lock, always in the same order (no deadlock
+        with another caller doing the same)."""
+        for shard in self.shards:
+            shard.lock.acquire()
+        try:
+            yield
+        finally:
+            for shard in reversed(self.shards):
+                shard.lock.release()
+
+    # --- mapping interface -------------------------------------------------
+    # Single-key reads take no lock: a dict lookup is atomic, and values
+    # are replaced whole, never mutated in place.
+    def __getitem__(self, username):
+        return self._shard(username).records[username]
+
+    def __setitem__(self, username, user):
+        # Durable first, then visible: a reader never sees a user that a
+        # crash could still lose. The backend's commit number orders racing
+        # writes to one username the same way in memory as in the log.
+        version = self.backend.append(user) or 0
+        shard = self._shard(username)
+        created = version if self.shared else next(self.created)
+        with shard.lock:
+            shard.put(username, user, version, created)
+        if self.on_write is not None:
+            self.on_write((username,))
+
+    def add_many(self, users):
+        """Insert a list of users, making them durable as one batch."""
+        first = self.backend.append_many(users)
+        if first is None:
+            self._apply([(0, user) for user in users])
+        else:
+            self._apply(list(enumerate(users, first)))
+
+    def refresh(self):
+        """Apply what other processes wrote to a shared backend.
+
+        Cheap when nothing changed: the backend compares one counter.
+        """
+        changes = self.backend.poll()
+        if changes:
+            self._apply(changes)
+
+    def _apply(self, changes):
+        """Make (version, user) pairs visible, then call on_write."""
+        # Group by shard so each lock is taken once per batch; creation
+        # numbers are drawn first so new users keep the batch's order
+        count = len(self.shards)
+        by_shard = [[] for _ in range(count)]
+        for version, user in changes:
+            username = user["username"]
+            by_shard[hash(username) % count].append(
+                (username, user, version,
+                 version if self.shared else next(self.created)))
+        for shard, items in zip(self.shards, by_shard):
+            if items:
+                with shard.lock:
+                    for username, user, version, created in items:
+                        shard.put(username, user, version, created)
+        if self.on_write is not None:
+            self.on_write([user["username"] for _, user in changes])
+
+    def __contains__(self, username):
+        return username in self._shard(username).records
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return sum(len(shard.records) for shard in self.shards)
+
+    def get(self, username, default=None):
+        return self._shard(username).records.get(username, default)
+
+    def keys(self):
+        """Usernames in insertion order, like the dict this replaces.
+
+        Every shard is locked while its names are copied, so the list is
+        one consistent snapshot; the merge happens after the locks drop.
+        """
+        with self.locked():
+            parts = [list(shard.meta.items()) for shard in self.shards]
+        # meta is already in creation order unless a shared backend's
+        # refresh() filled in older writes late; sorting a sorted list is
+        # a linear pass
+        parts = [sorted(part, key=lambda item: item[1][0]) for part in parts]
+        merged = heapq.merge(*parts, key=lambda item: item[1][0])
+        return [username for username, _ in merged]
+
+    def clear(self):
+        with self.locked():
+            names = [name for shard in self.shards for name in shard.records]
+            for shard in self.shards:
+                shard.clear()
+        if self.on_write is not None:
+            self.on_write(names)
+
+    # --- ordered access ----------------------------------------------------
+    def _merge(self, pages, limit):
+        """First ``limit`` keys of the shards' sorted pages."""
+        return list(itertools.islice(heapq.merge(*pages), limit))
+
+    def page(self, after=None, limit=100):
+        """Up to ``limit`` usernames sorted after ``after`` (exclusive)."""
+        pages = []
+        for shard in self.shards:
+            with shard.lock:
+                pages.append(shard.order.page(after, limit))
+        return self._merge(pages, limit)
+
+    def iter_after(self, after=None, batch=1000):
+        """Yield every username after ``after``, a page at a time.
+
+        Locks are held only while a page is fetched, so writers are never
+        blocked for long and nothing is copied up front.
+        """
+        while True:
+            names = self.page(after, batch)
+            yield from names
+            if len(names) < batch:
+                return
+            after = names[-1]
+
+    # --- filtered access ---------------------------------------------------
+    def query(self, city=None, min_age=None, max_age=None, after=None,
+              limit=100):
+        """Usernames matching every given filter, one page at a time.
+
+        Pages are ordered by username, or by (age, username) when an age
+        bound is given. Returns (usernames, next) where ``next`` is the
+        ``after`` value for the following page, or None on the last one.
+        Each shard picks its own plan (see _Shard.query).
+        """
+        by_age = min_age is not None or max_age is not None
+        if by_age and after is not None:
+            after = tuple(after)
+        pages = []
+        for shard in self.shards:
+            with shard.lock:
+                pages.append(shard.query(city, min_age, max_age, after,
+                                         limit + 1))
+        keys = self._merge(pages, limit + 1)
+        names = [name for _, name in keys] if by_age else keys
+        if len(keys) > limit:
+            return names[:limit], keys[limit - 1]
+        return names, None
+
+
+# --- bulk ingestion ----------------------------------------------------------
+def make_user(payload):
+    """Validate a decoded user payload; return (user, None) or (None, error).
+
+    Usernames must be strings: they are the sort key of the index and the
+    /users/<username> path segment.
+    """
+    if not isinstance(payload, dict):
+        return None, "Expected a JSON object"
+    username = payload.get("username")
+    if not username:
+        return None, "Username is required"
+    if not isinstance(username, str):
+        return None, "Username must be a string"
+    user = {"username": username}
+    for field in USER_FIELDS:
+        user[field] = payload.get(field)
+    return user, None
+
+
+def ingest_ndjson(stream, store, batch_size=BULK_BATCH):
+    """Read one user per line from a binary stream into ``store``.
+
+    Lines are parsed and validated as they arrive and inserted in batches,
+    so memory is bounded by the batch, not by the body. Blank lines are
+    skipped. Returns a summary with per-line errors (1-based line numbers,
+    the first MAX_REPORTED_ERRORS in detail).
+    """
+    # One decoder for the whole body; str input skips json.loads()'s
+    # per-call encoding detection
+    decode = json.JSONDecoder().decode
+    added = failed = 0
+    errors = []
+    batch = []
+    lineno = 0
+    while True:
+        line = stream.readline(MAX_LINE + 1)
+        if not line:
+            break
+        lineno += 1
+        error = None
+        if len(line) > MAX_LINE and not line.endswith(b"\n"):
+            # Skip the rest of the oversized line
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(MAX_LINE + 1)
+            error = f"Line longer than {MAX_LINE} bytes"
+        elif line.strip():
+            try:
+                user, error = make_user(decode(line.decode()))
+            except ValueError as exc:
+                error = f"Invalid JSON: {exc}"
+            else:
+                if user is not None:
+                    batch.append(user)
+                    if len(batch) >= batch_size:
+                        store.add_many(batch)
+                        added += len(batch)
+                        batch = []
+        if error is not None:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": lineno, "error": error})
+    if batch:
+        store.add_many(batch)
+        added += len(batch)
+    return {
+        "added": added,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }